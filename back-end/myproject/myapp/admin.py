@@ -1,13 +1,144 @@
-from django.contrib import admin
-from .models import Product, Category
+import re
 
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Round
+from django.utils.functional import cached_property
+
+from .models import Job, Product, Category
+from .products.cache import bump_version
+from .products.facets import apply_deltas, repricing_deltas, stock_changed
+from .products.search import full_text_search, search_supported
+from .products.snapshots import rebuild_handler
 
 # Register your models here.
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the size of an unfiltered PostgreSQL table from the
+    planner's statistics instead of running COUNT(*) for every page, once it
+    is above `estimate_above` rows. Filtered lists and other backends are
+    counted exactly; an estimate only shifts the last page links.
+    """
+    estimate_above = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimate(self.object_list)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been vacuumed or analyzed.
+        return int(row[0]) if row and row[0] >= 0 else None
+
+
+class StockFilter(admin.SimpleListFilter):
+    title = 'stock'
+    parameter_name = 'stock'
+
+    def lookups(self, request, model_admin):
+        return (('in', 'In stock'), ('out', 'Out of stock'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'in':
+            return queryset.filter(quantity__gt=0)
+        if self.value() == 'out':
+            return queryset.filter(quantity=0)
+        return queryset
+
+
+class ProductActionForm(ActionForm):
+    percentage = forms.DecimalField(required=False, max_digits=6, decimal_places=2, min_value=-99, max_value=1000,
+                                    help_text='For price changes, e.g. 10 or -15.')
+    quantity = forms.IntegerField(required=False, min_value=1, help_text='For restocking.')
+
+
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'price', 'quantity', 'category')
+    list_select_related = ('category',)
+    list_filter = ('category', StockFilter)
+    # Searches go through the full-text index (see get_search_results); '^name'
+    # is the fallback on databases without one.
+    search_fields = ('^name',)
+    autocomplete_fields = ('category',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = ProductActionForm
+    actions = ('change_price', 'restock')
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = re.findall(r'\w+', search_term)
+        if not terms or not search_supported(connections[queryset.db]):
+            return super().get_search_results(request, queryset, search_term)
+        return full_text_search(queryset, terms), False
+
+    def get_action_value(self, request, field, message):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        value = form.cleaned_data.get(field) if form.is_valid() else None
+        if value is None:
+            self.message_user(request, message, messages.ERROR)
+        return value
+
+    def products_changed(self):
+        # queryset.update() sends no signals, so do what the save handlers would.
+        transaction.on_commit(lambda: bump_version(Product))
+        rebuild_handler(Product)
+
+    @admin.action(description='Change price of selected products by a percentage', permissions=['change'])
+    def change_price(self, request, queryset):
+        percentage = self.get_action_value(request, 'percentage', 'Enter the percentage to change prices by.')
+        if percentage is None:
+            return
+        price = Round(F('price') * (1 + percentage / 100), 2)
+        with transaction.atomic():
+            apply_deltas(repricing_deltas(queryset, price))
+            updated = queryset.update(price=price)
+            self.products_changed()
+        self.message_user(request, f'Changed the price of {updated} products by {percentage}%.', messages.SUCCESS)
+
+    @admin.action(description='Restock selected products', permissions=['change'])
+    def restock(self, request, queryset):
+        quantity = self.get_action_value(request, 'quantity', 'Enter the quantity to add to each product.')
+        if quantity is None:
+            return
+        with transaction.atomic():
+            stock_changed(restocked=queryset.filter(quantity=0))
+            updated = queryset.update(quantity=F('quantity') + quantity)
+            self.products_changed()
+        self.message_user(request, f'Added {quantity} to the stock of {updated} products.', messages.SUCCESS)
+
+
+class CategoryAdmin(admin.ModelAdmin):
+    # Needed by the product form's category autocomplete.
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('claim', 'locked_until', 'created_at', 'finished_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Product, ProductAdmin)
-admin.site.register(Category)
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Job, JobAdmin)
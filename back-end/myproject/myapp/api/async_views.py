@@ -0,0 +1,115 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, serializers, status
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..cart.services import CART_TOKEN_HEADER, merge_guest_cart
+from .hashing import HashingPoolSaturated, PooledModelBackend
+from .serializers import RegisterUserSerializer
+from .throttling import LOGIN_THROTTLES, REGISTER_THROTTLES, throttle_wait
+
+
+# Async counterparts of UserLoginView and UserRegisterView for ASGI deployments
+# (ASYNC_ACCOUNT_VIEWS). Password hashing is awaited on the hashing pool so the
+# event loop keeps serving other requests meanwhile. Responses match the sync views.
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False, headers=headers)
+
+
+def retry_response(exc):
+    return json_response({'detail': str(exc.detail)}, status=exc.status_code, headers={'Retry-After': str(exc.wait)})
+
+
+async def check_throttles(throttle_classes, request):
+    """A 429 response if `request` is throttled, like DRF views send, else None."""
+    wait = await sync_to_async(throttle_wait)(throttle_classes, Request(request, parsers=[JSONParser()]))
+    return None if wait is None else retry_response(exceptions.Throttled(wait))
+
+
+def parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncUserLoginView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        data = parse_body(request)
+        if data is None:
+            return json_response({'detail': 'JSON parse error.'}, status=status.HTTP_400_BAD_REQUEST)
+        throttled = await check_throttles(LOGIN_THROTTLES, request)
+        if throttled is not None:
+            return throttled
+        errors = {field: ['This field is required.'] for field in ('username', 'password') if not data.get(field)}
+        if errors:
+            return json_response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await PooledModelBackend().aauthenticate(request, username=data['username'], password=data['password'])
+        except HashingPoolSaturated as exc:
+            return retry_response(exc)
+        if user is None:
+            return json_response({'non_field_errors': ['Invalid login credentials']}, status=status.HTTP_400_BAD_REQUEST)
+
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
+        user.last_login = timezone.now()
+        await user.asave(update_fields=['last_login'])
+        cart_token = data.get('cart_token') or request.headers.get(CART_TOKEN_HEADER)
+        if cart_token:
+            await sync_to_async(merge_guest_cart)(cart_token, user)
+        return json_response({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'last_login': user.last_login,
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncUserRegisterView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        data = parse_body(request)
+        if data is None:
+            return json_response({'detail': 'JSON parse error.'}, status=status.HTTP_400_BAD_REQUEST)
+        throttled = await check_throttles(REGISTER_THROTTLES, request)
+        if throttled is not None:
+            return throttled
+        try:
+            return json_response(await sync_to_async(self.register)(data))
+        except HashingPoolSaturated as exc:
+            return retry_response(exc)
+        except serializers.ValidationError as exc:
+            return json_response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    def register(self, data):
+        serializer = RegisterUserSerializer(data=data)
+        if not serializer.is_valid():
+            return serializer.errors
+        account = serializer.save()
+        refresh = RefreshToken.for_user(account)
+        return {
+            'response': 'Account has been created',
+            'username': account.username,
+            'email': account.email,
+            'token': {
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+            },
+        }
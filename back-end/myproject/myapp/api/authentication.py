@@ -0,0 +1,117 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from ..instrumentation.middleware import phase
+
+
+def is_shared_cache(cache):
+    """Whether every process sees the same `cache`; locmem and dummy caches are per process."""
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+class UserCache:
+    """
+    Two-level cache of users by id: a small per-process dict in front of the shared cache.
+
+    The per-process level can only be invalidated in the process that made
+    the change, so its TTL is kept short; the shared level is invalidated
+    everywhere. When AUTH_USER_CACHE_ALIAS is not shared between processes
+    it cannot be invalidated everywhere either, so it gets the short TTL too.
+    Ids are compared as strings, the way they appear in tokens.
+    """
+
+    def __init__(self, local_timeout=5, max_local_entries=10000):
+        self.local_timeout = local_timeout
+        self.max_local_entries = max_local_entries
+        self.local = {}
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def key(user_id):
+        return f'auth:user:{user_id}'
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        entry = self.local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return copy.copy(entry[1])
+
+        user = self.shared.get(self.key(user_id))
+        if user is not None:
+            self.set_local(user_id, user)
+        return user
+
+    def set(self, user_id, user):
+        user_id = str(user_id)
+        shared = self.shared
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60) if is_shared_cache(shared) else self.local_timeout
+        shared.set(self.key(user_id), user, timeout)
+        self.set_local(user_id, user)
+
+    def set_local(self, user_id, user):
+        with self.lock:
+            if len(self.local) >= self.max_local_entries:
+                self.local.clear()
+            self.local[user_id] = (time.monotonic() + self.local_timeout, copy.copy(user))
+
+    def delete(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            self.local.pop(user_id, None)
+        self.shared.delete(self.key(user_id))
+
+
+user_cache = UserCache()
+
+
+def invalidate_cached_user_handler(sender, instance, **kwargs):
+    user_cache.delete(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from `user_cache`
+    instead of querying the database on every request.
+    """
+
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            user_cache.set(user_id, user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,198 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from .authentication import is_shared_cache
+
+
+GENERATION_KEY = 'token_blacklist:generation'
+EPOCH_KEY = 'token_blacklist:epoch'
+# Incremental syncs re-read this much history so rows from transactions that
+# committed late (or on a server with a skewed clock) are not missed.
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        if value in self:
+            return
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+    def error_rate(self):
+        """Expected false-positive rate at the current fill."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted JTIs in front of the token_blacklist tables.
+
+    A JTI that is not in the filter is certainly not blacklisted, so the
+    common case skips the database. Writes bump a generation in the shared
+    cache; a process that sees a new generation loads only the rows
+    blacklisted since its last sync (minus SYNC_OVERLAP), and a new epoch
+    (after compaction) rebuilds the filter from scratch.
+
+    That only works if TOKEN_BLACKLIST_CACHE_ALIAS is shared by every
+    process. With a per-process cache (locmem, dummy) other processes'
+    writes are never announced, so every check goes to the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = None
+        self.generation = None
+        self.epoch = None
+        self.checks = 0
+        self.database_checks = 0
+        self.check_seconds = 0.0
+        self.rebuilds = 0
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'TOKEN_BLACKLIST_CACHE_ALIAS', 'default')]
+
+    def shared_state(self):
+        state = self.cache.get_many([GENERATION_KEY, EPOCH_KEY])
+        for key in (GENERATION_KEY, EPOCH_KEY):
+            if key not in state:
+                self.cache.add(key, time.time_ns(), timeout=None)
+                state[key] = self.cache.get(key)
+        return state[GENERATION_KEY], state[EPOCH_KEY]
+
+    def rebuild(self, epoch):
+        synced_at = timezone.now()
+        jtis = BlacklistedToken.objects.values_list('token__jti', flat=True)
+        capacity = max(getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000), jtis.count() * 2)
+        bloom = BloomFilter(capacity, getattr(settings, 'TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.001))
+        for jti in jtis.iterator(chunk_size=5000):
+            bloom.add(jti)
+        self.filter, self.synced_at, self.epoch = bloom, synced_at, epoch
+        self.rebuilds += 1
+
+    def sync(self):
+        generation, epoch = self.shared_state()
+        if generation == self.generation and epoch == self.epoch and self.filter is not None:
+            return
+        with self.lock:
+            if self.filter is None or epoch != self.epoch or self.filter.count >= self.filter.capacity:
+                self.rebuild(epoch)
+            else:
+                synced_at = timezone.now()
+                for jti in BlacklistedToken.objects.filter(
+                        blacklisted_at__gte=self.synced_at - SYNC_OVERLAP).values_list('token__jti', flat=True):
+                    self.filter.add(jti)
+                self.synced_at = synced_at
+            self.generation = generation
+
+    def is_blacklisted(self, jti):
+        started = time.perf_counter()
+        if is_shared_cache(self.cache):
+            self.sync()
+            blacklisted = jti in self.filter
+        else:
+            blacklisted = True
+        if blacklisted:
+            self.database_checks += 1
+            blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        self.checks += 1
+        self.check_seconds += time.perf_counter() - started
+        return blacklisted
+
+    def add(self, jti):
+        if self.filter is not None:
+            with self.lock:
+                self.filter.add(jti)
+
+    def changed(self):
+        transaction.on_commit(lambda: self.cache.set(GENERATION_KEY, time.time_ns(), timeout=None))
+
+    def compacted(self):
+        self.cache.set(EPOCH_KEY, time.time_ns(), timeout=None)
+
+    def stats(self):
+        return {
+            'filter_entries': self.filter.count if self.filter else 0,
+            'filter_capacity': self.filter.capacity if self.filter else 0,
+            'filter_bytes': len(self.filter.bits) if self.filter else 0,
+            'filter_error_rate': self.filter.error_rate() if self.filter else 0.0,
+            'rebuilds': self.rebuilds,
+            'checks': self.checks,
+            'database_checks': self.database_checks,
+            'average_check_ms': self.check_seconds / self.checks * 1000 if self.checks else 0.0,
+        }
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def compact_expired(batch_size=1000):
+    """
+    Delete outstanding and blacklisted tokens past their expiry in batches of
+    `batch_size`, then have every process rebuild its filter; returns how
+    many tokens were deleted.
+    """
+    deleted = 0
+    now = aware_utcnow()
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    if deleted:
+        blacklist_filter.compacted()
+    return deleted
+
+
+def blacklisted_token_saved_handler(sender, created=False, **kwargs):
+    # Covers every writer, including plain RefreshToken.blacklist() and the admin.
+    if created:
+        blacklist_filter.changed()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken whose blacklist check goes through `blacklist_filter`."""
+
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy. Please try again shortly.'
+    default_code = 'hashing_pool_saturated'
+
+
+def setup_worker():
+    django.setup()
+
+
+class HashingPool:
+    """
+    Runs password hashing on a bounded executor instead of the request thread.
+
+    At most MAX_PENDING hashes may be queued or running; beyond that calls
+    fail fast with HashingPoolSaturated (503) rather than tying up workers.
+    PBKDF2 releases the GIL, so the default thread executor scales across
+    cores; EXECUTOR = 'process' is available for hashers that do not.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.slots = None
+
+    @property
+    def options(self):
+        return {'EXECUTOR': 'thread', 'WORKERS': 4, 'MAX_PENDING': 32, 'TIMEOUT': 10, 'RETRY_AFTER': 1,
+                **getattr(settings, 'PASSWORD_HASHING', {})}
+
+    def get_executor(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    options = self.options
+                    if options['EXECUTOR'] == 'process':
+                        executor = ProcessPoolExecutor(options['WORKERS'], initializer=setup_worker)
+                    else:
+                        executor = ThreadPoolExecutor(options['WORKERS'], thread_name_prefix='password-hashing')
+                    self.slots = threading.BoundedSemaphore(options['MAX_PENDING'])
+                    self.executor = executor
+        return self.executor
+
+    def saturated(self):
+        exc = HashingPoolSaturated()
+        exc.wait = self.options['RETRY_AFTER']  # sent as Retry-After by DRF's exception handler
+        return exc
+
+    def submit(self, fn, *args):
+        executor = self.get_executor()
+        if not self.slots.acquire(blocking=False):
+            raise self.saturated()
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, fn, *args):
+        try:
+            return self.submit(fn, *args).result(timeout=self.options['TIMEOUT'])
+        except TimeoutError:
+            raise self.saturated()
+
+    async def arun(self, fn, *args):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(fn, *args)), self.options['TIMEOUT'])
+        except asyncio.TimeoutError:
+            raise self.saturated()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+hashing_pool = HashingPool()
+
+
+def hash_password(password):
+    return hashing_pool.run(make_password, password)
+
+
+def check_password(user, password):
+    """Verify `password` for `user` off the request thread, upgrading the stored hash if needed."""
+    is_correct, must_update = hashing_pool.run(verify_password, password, user.password)
+    if is_correct and must_update:
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+async def acheck_password(user, password):
+    is_correct, must_update = await hashing_pool.arun(verify_password, password, user.password)
+    if is_correct and must_update:
+        user.password = await hashing_pool.arun(make_password, password)
+        await user.asave(update_fields=['password'])
+    return is_correct
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that verifies passwords through `hashing_pool`."""
+
+    def get_credentials(self, username, kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        return username
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        username = self.get_credentials(username, kwargs)
+        if username is None or password is None:
+            return None
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so a missing user takes as long as a wrong password.
+            hash_password(password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        username = self.get_credentials(username, kwargs)
+        if username is None or password is None:
+            return None
+        UserModel = get_user_model()
+        try:
+            user = await UserModel._default_manager.aget(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            await hashing_pool.arun(make_password, password)
+            return None
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -2,6 +2,10 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.serializers import TokenBlacklistSerializer, TokenRefreshSerializer
+from .blacklist import FilteredRefreshToken
+from .hashing import check_password, hash_password
+from .tasks import send_welcome_email
 from ..models import Product, Category
 
 
@@ -22,8 +26,9 @@ class RegisterUserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Email is already used')
 
         account = User(email=self.validated_data['email'], username=self.validated_data['username'])
-        account.set_password(password)
+        account.password = hash_password(password)
         account.save()
+        send_welcome_email.enqueue(account.id)
         return account
 
 
@@ -70,7 +75,7 @@ class AccountUpdateSerializer(serializers.Serializer):
 
     def validate_old_password(self, value):
         user = self.context['request'].user
-        if not user.check_password(value):
+        if not check_password(user, value):
             raise serializers.ValidationError("Old password is incorrect.")
         return value
 
@@ -91,15 +96,20 @@ class AccountUpdateSerializer(serializers.Serializer):
         return value
 
     def update(self, instance, validated_data):
-        user = self.context['request'].user
+        # The instance may come from the user cache and be seconds old, so only
+        # the changed columns are written; a full save would revert is_active,
+        # last_login, ... changed elsewhere in the meantime.
+        changed = []
         if 'new_password' in validated_data:
-            user.set_password(validated_data['new_password'])
-        if 'username' in validated_data:
-            user.username = validated_data['username']
-        if 'email' in validated_data:
-            user.email = validated_data['email']
-
-        instance.save()
+            instance.password = hash_password(validated_data['new_password'])
+            changed.append('password')
+        for field in ('username', 'email'):
+            if field in validated_data:
+                setattr(instance, field, validated_data[field])
+                changed.append(field)
+
+        if changed:
+            instance.save(update_fields=changed)
         return instance
 
 
@@ -107,3 +117,11 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('is_superuser', 'username', 'email')
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class FilteredTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+
+from ..tasks.services import task
+from .blacklist import compact_expired
+
+
+@task('accounts.welcome')
+def send_welcome_email(user_id):
+    user = get_user_model().objects.filter(id=user_id).first()
+    if user is None or not user.email:
+        return
+    send_mail(
+        'Welcome!',
+        f'Hi {user.username},\n\nyour account has been created. Happy shopping!\n',
+        None, [user.email],
+    )
+
+
+@task('accounts.compact_token_blacklist')
+def compact_token_blacklist(batch_size=1000):
+    compact_expired(batch_size)
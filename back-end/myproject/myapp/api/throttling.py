@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def get_options():
+    return {'ENABLED': True, 'STORE': 'local', 'CACHE_ALIAS': 'default', 'MAX_ENTRIES': 100000,
+            **getattr(settings, 'THROTTLING', {})}
+
+
+def sliding_count(previous, current, elapsed, window):
+    """Requests in the last `window` seconds, assuming the previous window's were spread evenly."""
+    return previous * (window - elapsed) / window + current
+
+
+def retry_after(previous, current, elapsed, limit, window):
+    """Seconds until `sliding_count` drops below `limit`, if nothing else is let through meanwhile."""
+    if current >= limit:
+        return window - elapsed
+    # previous * (window - elapsed - t) / window + current < limit
+    return max(0.0, window - elapsed - (limit - current) * window / previous)
+
+
+class LocalStore:
+    """
+    Per-process sliding-window counters: two integers per key, in an LRU of
+    at most `max_entries` keys. Limits apply per worker process.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window, now=None):
+        """Count a request for `key` if it is under `limit` per `window`; returns (allowed, retry after)."""
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, window)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [index, 0, 0]
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end(key)
+                if entry[0] != index:
+                    entry[2] = entry[1] if entry[0] == index - 1 else 0
+                    entry[0], entry[1] = index, 0
+
+            _, current, previous = entry
+            if sliding_count(previous, current, elapsed, window) >= limit:
+                return False, retry_after(previous, current, elapsed, limit, window)
+            entry[1] += 1
+            return True, None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CacheStore:
+    """
+    Sliding-window counters in a shared cache, so limits hold across processes.
+
+    Each window is its own key, expiring once it can no longer be the previous
+    window. The check and the increment are separate round trips, so bursts
+    racing across processes can overshoot the limit slightly.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, window)
+        current_key, previous_key = f'{key}:{int(index)}', f'{key}:{int(index) - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if sliding_count(previous, current, elapsed, window) >= limit:
+            return False, retry_after(previous, current, elapsed, limit, window)
+        if not self.cache.add(current_key, 1, timeout=int(window * 2) + 1):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr().
+                self.cache.set(current_key, 1, timeout=int(window * 2) + 1)
+        return True, None
+
+    def clear(self):
+        pass
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def get_store():
+    options = get_options()
+    key = (options['STORE'], options['CACHE_ALIAS'], options['MAX_ENTRIES'])
+    if key not in stores:
+        with stores_lock:
+            if key not in stores:
+                if options['STORE'] == 'cache':
+                    stores[key] = CacheStore(options['CACHE_ALIAS'])
+                else:
+                    stores[key] = LocalStore(options['MAX_ENTRIES'])
+    return stores[key]
+
+
+def reset_throttles():
+    for store in list(stores.values()):
+        store.clear()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle with a constant-time check: instead of a list of
+    request timestamps per key, the store keeps two counters (this window and
+    the previous one). Rates come from DEFAULT_THROTTLE_RATES by scope.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_rate(self):
+        # Read at request time, not import time, so settings changes apply.
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if not get_options()['ENABLED']:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.retry_after = get_store().hit(key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """Limits by client address (honours NUM_PROXIES for X-Forwarded-For)."""
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UsernameRateThrottle(SlidingWindowThrottle):
+    """Limits attempts against one account, whichever addresses they come from."""
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username:
+            return None
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginIPThrottle(IPRateThrottle):
+    scope = 'login_ip'
+
+
+class LoginUsernameThrottle(UsernameRateThrottle):
+    scope = 'login_username'
+
+
+class RegisterIPThrottle(IPRateThrottle):
+    scope = 'register_ip'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginUsernameThrottle]
+REGISTER_THROTTLES = [RegisterIPThrottle]
+
+
+def throttle_wait(throttle_classes, request, view=None):
+    """
+    For views outside DRF: None if `request` (a DRF Request) passes every
+    throttle, else the longest wait in seconds, as APIView.check_throttles would.
+    """
+    waits = [throttle.wait() for throttle in (cls() for cls in throttle_classes)
+             if not throttle.allow_request(request, view)]
+    return max(waits) if waits else None
@@ -1,14 +1,18 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from .views import *
+from .async_views import AsyncUserLoginView, AsyncUserRegisterView
 
 
 
 urlpatterns = [
     path('', views.getRoutes),
-    path('register/', UserRegisterView.as_view(), name="register"),
-    path('login/', UserLoginView.as_view(), name="login"),
+    path('register/', (AsyncUserRegisterView if settings.ASYNC_ACCOUNT_VIEWS else UserRegisterView).as_view(),
+         name="register"),
+    path('login/', (AsyncUserLoginView if settings.ASYNC_ACCOUNT_VIEWS else UserLoginView).as_view(), name="login"),
     path('logout/', LogoutView.as_view(), name="logout"),
     path('update/', AccountUpdateView.as_view(), name='account-update'),
     path('info/', UserViewSet.as_view({'get': 'retrieve'}), name='user_info'),
+    path('token-blacklist/stats/', TokenBlacklistStatsView.as_view(), name='token-blacklist-stats'),
 ]
\ No newline at end of file
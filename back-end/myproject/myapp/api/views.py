@@ -1,12 +1,16 @@
 from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from ..cart.services import CART_TOKEN_HEADER, merge_guest_cart
+from .blacklist import FilteredRefreshToken, blacklist_filter
 from .serializers import RegisterUserSerializer, LoginUserSerializer, UserSerializer, AccountUpdateSerializer
+from .throttling import LOGIN_THROTTLES, REGISTER_THROTTLES
 from rest_framework import status, generics, viewsets, filters
 from drf_yasg import openapi
 
@@ -27,6 +31,8 @@ def getRoutes(request):
 
 
 class UserRegisterView(APIView):
+    throttle_classes = REGISTER_THROTTLES
+
     @swagger_auto_schema(
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -59,7 +65,6 @@ class UserRegisterView(APIView):
         }
     )
     def post(self, request):
-        print(request)
         serializer = RegisterUserSerializer(data=request.data)
         data = {}
         if serializer.is_valid():
@@ -99,7 +104,7 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh_token"]
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
 
             return Response(status=status.HTTP_205_RESET_CONTENT)
@@ -108,12 +113,16 @@ class LogoutView(APIView):
 
 
 class UserLoginView(APIView):
+    throttle_classes = LOGIN_THROTTLES
+
     @swagger_auto_schema(
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
                 'username': openapi.Schema(type=openapi.TYPE_STRING, description='Username'),
                 'password': openapi.Schema(type=openapi.TYPE_STRING, description='Password', format='password'),
+                'cart_token': openapi.Schema(type=openapi.TYPE_STRING,
+                                             description='Guest cart to merge into the user\'s cart'),
             },
             required=['username', 'password']
         ),
@@ -141,6 +150,9 @@ class UserLoginView(APIView):
             access_token = refresh.access_token
             user.last_login = timezone.now()
             user.save(update_fields=['last_login'])
+            cart_token = request.data.get('cart_token') or request.headers.get(CART_TOKEN_HEADER)
+            if cart_token:
+                merge_guest_cart(cart_token, user)
 
             return Response({
                 'refresh': str(refresh),
@@ -227,3 +239,20 @@ class UserViewSet(viewsets.ViewSet):
         user = request.user
         serializer = UserSerializer(user)
         return Response(serializer.data)
+
+
+class TokenBlacklistStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(
+        operation_description="Token blacklist table sizes and this process's Bloom filter statistics.",
+        responses={200: 'Statistics', 403: 'Admin only'}
+    )
+    def get(self, request):
+        now = timezone.now()
+        return Response({
+            'outstanding_tokens': OutstandingToken.objects.count(),
+            'expired_outstanding_tokens': OutstandingToken.objects.filter(expires_at__lte=now).count(),
+            'blacklisted_tokens': BlacklistedToken.objects.count(),
+            **blacklist_filter.stats(),
+        })
@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_save, post_save, post_delete
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from .models import Product, Category
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+        from .api.authentication import invalidate_cached_user_handler
+        from .api.blacklist import blacklisted_token_saved_handler
+        from .products.cache import category_written_handler, product_written_handler
+        from .products.facets import product_deleted_handler, product_pre_save_handler, product_saved_handler
+        from .instrumentation.middleware import install_query_recorder_handler
+        from .images.processing import pillow_check
+        from .products.search import install_search_index_handler
+        from .products.snapshots import rebuild_handler
+        from .tasks.services import autodiscover
+
+        post_migrate.connect(install_search_index_handler, sender=self)
+        connection_created.connect(install_query_recorder_handler)
+        post_save.connect(category_written_handler, sender=Category)
+        post_delete.connect(category_written_handler, sender=Category)
+        pre_save.connect(product_pre_save_handler, sender=Product)
+        post_save.connect(product_written_handler, sender=Product)
+        post_delete.connect(product_written_handler, sender=Product)
+        post_save.connect(product_saved_handler, sender=Product)
+        post_delete.connect(product_deleted_handler, sender=Product)
+        post_save.connect(rebuild_handler, sender=Product)
+        post_delete.connect(rebuild_handler, sender=Product)
+        post_save.connect(invalidate_cached_user_handler, sender=get_user_model())
+        post_delete.connect(invalidate_cached_user_handler, sender=get_user_model())
+        post_save.connect(blacklisted_token_saved_handler, sender=BlacklistedToken)
+        autodiscover()
+        checks.register(pillow_check)
@@ -0,0 +1,321 @@
+import gzip
+import json
+import queue
+import random
+import statistics
+import subprocess
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from .compression import brotli, get_options as get_compression_options
+from .loadtest import HttpDriver
+from .models import Category, Product
+from .products.cache import bump_version
+from .products.facets import rebuild_facet_counts
+from .products.renderers import data_renderer_classes
+from .products.serializers import ProductSerializer
+
+
+# Repeatable benchmark of the public API: seed a known data set, then drive a
+# running server through fixed scenarios and report latency per endpoint. The
+# data set and the request mix only depend on the seed, so two runs against
+# different commits are directly comparable.
+
+USER_PREFIX = 'bench-user-'
+ADMIN_USERNAME = 'bench-admin'
+PASSWORD = 'bench-password-1'
+CATEGORY_PREFIX = 'Bench '
+WORDS = (
+    'red', 'blue', 'green', 'black', 'steel', 'wooden', 'linen', 'leather', 'compact', 'classic',
+    'lamp', 'chair', 'table', 'jacket', 'kettle', 'speaker', 'backpack', 'notebook', 'mug', 'blanket',
+)
+SCENARIOS = ('browse', 'search', 'login', 'refresh', 'bulk_edit')
+
+
+def seed(categories=50, products=10000, users=200, rng_seed=0, stdout=None):
+    """Top the database up to the requested sizes; existing benchmark rows are kept."""
+    rng = random.Random(rng_seed)
+    existing = list(Category.objects.filter(name__startswith=CATEGORY_PREFIX).values_list('id', flat=True))
+    if len(existing) < categories:
+        Category.objects.bulk_create([
+            Category(name=f'{CATEGORY_PREFIX}{i}') for i in range(len(existing), categories)
+        ])
+    category_ids = list(Category.objects.filter(name__startswith=CATEGORY_PREFIX).order_by('id')
+                        .values_list('id', flat=True))
+
+    start = Product.objects.filter(category_id__in=category_ids).count()
+    for offset in range(start, products, 5000):
+        with transaction.atomic():
+            Product.objects.bulk_create([
+                Product(name=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                        description=' '.join(rng.choices(WORDS, k=12)),
+                        price=round(rng.uniform(1, 500), 2), quantity=rng.randint(0, 50),
+                        category_id=rng.choice(category_ids))
+                for _ in range(offset, min(offset + 5000, products))
+            ])
+        if stdout:
+            stdout.write(f'\rseeded {min(offset + 5000, products)}/{products} products', ending='')
+    if start < products:
+        # bulk_create skips the signals that keep these in step.
+        rebuild_facet_counts()
+        bump_version(Product)
+        if stdout:
+            stdout.write('')
+
+    # One hash for everyone: seeding should not take as long as a login storm.
+    password = make_password(PASSWORD)
+    have = User.objects.filter(username__startswith=USER_PREFIX).count()
+    User.objects.bulk_create([User(username=f'{USER_PREFIX}{i}', password=password) for i in range(have, users)])
+    if not User.objects.filter(username=ADMIN_USERNAME).exists():
+        User.objects.create(username=ADMIN_USERNAME, password=password, is_staff=True, is_superuser=True)
+
+    rows = Product.objects.filter(category_id__in=category_ids).order_by('id')[:products]
+    return {
+        'categories': category_ids,
+        'products': {
+            id: (name, description) for id, name, description in rows.values_list('id', 'name', 'description')
+        },
+        'users': users,
+    }
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """The project's WSGI application on a free local port, served from a background thread."""
+
+    def __init__(self, host='127.0.0.1'):
+        self.server = ThreadedWSGIServer((host, 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+        self.server.set_app(get_internal_wsgi_application())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def get(driver, path, **params):
+    return driver.request('GET', f'{path}?{urlencode(params)}' if params else path)[0]
+
+
+def post_json(driver, path, data):
+    return driver.request('POST', path, json.dumps(data), {'Content-Type': 'application/json'})
+
+
+def login(driver, username):
+    status, body = post_json(driver, '/account/login/', {'username': username, 'password': PASSWORD})
+    if status != 200:
+        raise RuntimeError(f'Login as {username} failed with {status}: {body[:200]!r}')
+    return json.loads(body)
+
+
+class Suite:
+    """
+    Runs each scenario as a sequence of endpoints; every endpoint gets its own
+    closed-loop run of `requests` requests so the numbers stay per endpoint.
+
+    Scenarios in `serial_scenarios` run on a single connection: admins do not
+    bulk edit in parallel, and concurrent imports would mostly measure lock
+    contention (or, on SQLite, "database is locked" errors).
+    """
+    serial_scenarios = ('bulk_edit',)
+
+    def __init__(self, url, data, requests=500, concurrency=16, rng_seed=0):
+        self.driver = HttpDriver(url, concurrency=concurrency)
+        self.serial_driver = HttpDriver(url, concurrency=1)
+        self.data = data
+        self.requests = requests
+        self.rng_seed = rng_seed
+
+    def rng(self, i):
+        # Request i gets the same parameters on every run, whatever thread sends it.
+        return random.Random(self.rng_seed * 1_000_003 + i)
+
+    def browse(self):
+        products, categories = list(self.data['products']), self.data['categories']
+        offsets = range(0, max(1, len(products) - 20), 20)
+        return {
+            'GET /categories/': lambda driver, i: get(driver, '/categories/'),
+            'GET /products/': lambda driver, i: get(driver, '/products/', limit=20, offset=self.rng(i).choice(offsets)),
+            'GET /products/?category=': lambda driver, i: get(
+                driver, '/products/', category=self.rng(i).choice(categories), limit=20),
+            'GET /products/?pagination=keyset': lambda driver, i: get(
+                driver, '/products/', pagination='keyset', ordering='price', limit=20),
+            'GET /products/facets/': lambda driver, i: get(
+                driver, '/products/facets/', category=self.rng(i).choice(categories)),
+            'GET /products/<id>/': lambda driver, i: get(driver, f'/products/{self.rng(i).choice(products)}/'),
+        }
+
+    def search(self):
+        def query(i):
+            rng = self.rng(i)
+            return ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+
+        return {
+            'GET /products/?search=': lambda driver, i: get(driver, '/products/', search=query(i), limit=20),
+            'GET /products/?search=&fields=': lambda driver, i: get(
+                driver, '/products/', search=query(i), fields='id,name,price', limit=20),
+        }
+
+    def login(self):
+        users = self.data['users']
+        return {
+            'POST /account/login/': lambda driver, i: post_json(
+                driver, '/account/login/', {'username': f'{USER_PREFIX}{i % users}', 'password': PASSWORD})[0],
+        }
+
+    def refresh(self):
+        # Refresh tokens rotate, so each request swaps one token from the pool for its successor.
+        tokens = queue.Queue()
+        for i in range(self.driver.concurrency):
+            tokens.put(login(self.driver, f'{USER_PREFIX}{i % self.data["users"]}')['refresh'])
+
+        def refresh(driver, i):
+            token = tokens.get()
+            status, body = post_json(driver, '/api/token/refresh/', {'refresh': token})
+            tokens.put(json.loads(body)['refresh'] if status == 200 else token)
+            return status
+
+        return {'POST /api/token/refresh/': refresh}
+
+    def bulk_edit(self, batch=50):
+        headers = {
+            'Authorization': f'Bearer {login(self.driver, ADMIN_USERNAME)["access"]}',
+            'Content-Type': 'application/x-ndjson',
+        }
+        products, categories = self.data['products'], self.data['categories']
+        ids = list(products)
+
+        def edit(driver, i):
+            # Names and descriptions are sent back unchanged so later search runs see the same text.
+            rng = self.rng(i)
+            body = ''.join(json.dumps({
+                'id': id, 'name': products[id][0], 'description': products[id][1],
+                'price': round(rng.uniform(1, 500), 2), 'quantity': rng.randint(0, 50),
+                'category': str(rng.choice(categories)),
+            }) + '\n' for id in rng.sample(ids, min(batch, len(ids))))
+            return driver.request('POST', '/products/import/', body, headers)[0]
+
+        return {f'POST /products/import/ ({batch} rows)': edit}
+
+    def run(self, scenarios=SCENARIOS, stdout=None):
+        results = {}
+        for name in scenarios:
+            driver = self.serial_driver if name in self.serial_scenarios else self.driver
+            for endpoint, make_request in getattr(self, name)().items():
+                results.setdefault(name, {})[endpoint] = driver.run(make_request, self.requests)
+                if stdout:
+                    stdout.write(format_row(name, endpoint, results[name][endpoint]))
+        return results
+
+
+def format_row(scenario, endpoint, stats):
+    return (f"{scenario:<10} {endpoint:<36} {stats['rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+            f"{stats['p99_ms']:>8} {stats['errors']:>7}")
+
+
+HEADER = f"{'scenario':<10} {'endpoint':<36} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}"
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results):
+    """Relative p95 change per endpoint against a previous report (positive is slower)."""
+    changes = {}
+    for scenario, endpoints in results.items():
+        for endpoint, stats in endpoints.items():
+            before = baseline.get('results', {}).get(scenario, {}).get(endpoint)
+            if before and before['p95_ms']:
+                changes[scenario, endpoint] = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms']
+    return changes
+
+
+# Rendering benchmark: time to render one /products/ page and its size on the
+# wire, per renderer and content coding, with HTTP and the database out of the
+# way. Pages are built from unsaved products, so no data set is needed.
+
+PAGE_SIZES = (6, 100, 10000)
+
+
+def sample_page(size, rng_seed=0):
+    """A limit/offset /products/ page of `size` products, as ProductViewSet returns it."""
+    rng = random.Random(rng_seed)
+    products = [
+        Product(id=id, name=' '.join(rng.sample(WORDS, 3)).capitalize(), description=' '.join(rng.choices(WORDS, k=12)),
+                price=Decimal(rng.randint(100, 50000)) / 100, quantity=rng.randint(0, 50),
+                category_id=rng.randint(1, 50), thumbnail=f'https://cdn.example.com/products/{id}.webp',
+                additional_images=[f'https://cdn.example.com/products/{id}-{i}.webp' for i in range(2)])
+        for id in range(1, size + 1)
+    ]
+    return {
+        'count': size * 10,
+        'next': f'http://localhost:8000/products/?limit={size}&offset={size}',
+        'previous': None,
+        'results': ProductSerializer(products, many=True, context={'images': {}}).data,
+    }
+
+
+def codings():
+    """Content codings to size responses with, as CompressionMiddleware would produce them."""
+    quality = get_compression_options()['BROTLI_QUALITY']
+    found = {'identity': lambda body: body, 'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        found['br'] = lambda body: brotli.compress(body, quality=quality)
+    return found
+
+
+def time_call(function, repeats):
+    """Median seconds of `repeats` calls, and the last result."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def measure_rendering(sizes=PAGE_SIZES, repeats=20, rng_seed=0):
+    """{size: {renderer: {'render_ms', 'bytes', '<coding>_bytes', '<coding>_ms'}}} for each page size."""
+    renderers = [JSONRenderer()] + [renderer_class() for renderer_class in data_renderer_classes()]
+    results = {}
+    for size in sizes:
+        page = sample_page(size, rng_seed)
+        # Fewer rounds for large pages, so a run stays in seconds.
+        rounds = max(3, repeats * 100 // max(size, 100))
+        for renderer in renderers:
+            seconds, body = time_call(lambda: renderer.render(page, renderer.media_type, {}), rounds)
+            stats = {'render_ms': round(seconds * 1000, 3), 'bytes': len(body)}
+            for coding, compress in codings().items():
+                if coding != 'identity':
+                    seconds, compressed = time_call(lambda: compress(body), rounds)
+                    stats[f'{coding}_bytes'] = len(compressed)
+                    stats[f'{coding}_ms'] = round(seconds * 1000, 3)
+            results.setdefault(size, {})[type(renderer).__name__] = stats
+    return results
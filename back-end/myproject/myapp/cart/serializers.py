@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from ..models import Product
+from ..products.serializers import PriceField
+
+
+MAX_CART_LINES = 200
+
+
+class CartLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0)
+    price = PriceField(required=False, allow_null=True, default=None,
+                       help_text='The price the shopper saw, used to report price changes.')
+
+
+class CartItemsSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True, max_length=MAX_CART_LINES)
+
+    def validate_items(self, items):
+        product_ids = {item['product'] for item in items if item['quantity']}
+        existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = sorted(product_ids - existing)
+        if missing:
+            raise serializers.ValidationError(f'Unknown products: {missing}')
+        return items
+
+
+class CartValidateSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True, max_length=MAX_CART_LINES, required=False)
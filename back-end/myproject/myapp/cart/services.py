@@ -0,0 +1,138 @@
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+
+from ..models import Cart, CartItem, Product
+
+
+CART_TOKEN_HEADER = 'X-Cart-Token'
+
+
+class UnknownProducts(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f'Unknown products: {product_ids}')
+        self.product_ids = product_ids
+
+
+def validate_items(items):
+    """
+    Reprice and stock-check a whole cart with one query.
+
+    `items` is an iterable of (product_id, quantity, seen_price) where
+    `seen_price` may be None. Lines for the same product are combined. Returns
+    the current line prices and total, plus every problem found: unknown
+    products, stock shortages and prices that changed since `seen_price`.
+    """
+    quantities, seen = Counter(), {}
+    for product_id, quantity, price in items:
+        quantities[product_id] += quantity
+        if price is not None:
+            seen[product_id] = price
+
+    products = Product.objects.only('id', 'name', 'price', 'quantity').in_bulk(list(quantities))
+    lines, missing, shortages, price_changes = [], [], [], []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            missing.append(product_id)
+            continue
+        if product.quantity < quantity:
+            shortages.append({'product': product_id, 'requested': quantity, 'available': product.quantity})
+        if product_id in seen and seen[product_id] != product.price:
+            price_changes.append({'product': product_id, 'old_price': seen[product_id], 'new_price': product.price})
+        lines.append({
+            'product': product_id,
+            'name': product.name,
+            'quantity': quantity,
+            'price': product.price,
+            'available': product.quantity,
+            'subtotal': product.price * quantity,
+        })
+
+    return {
+        'items': lines,
+        'total': sum((line['subtotal'] for line in lines), Decimal(0)),
+        'valid': not (missing or shortages or price_changes),
+        'missing': missing,
+        'shortages': shortages,
+        'price_changes': price_changes,
+    }
+
+
+def cart_lines(cart):
+    return list(cart.items.values_list('product_id', 'quantity', 'price'))
+
+
+def validate_cart(cart, reprice=False):
+    """Validate a stored cart; with `reprice`, changed prices are accepted and saved in one bulk update."""
+    result = validate_items(cart_lines(cart) if cart is not None else [])
+    if reprice and result['price_changes']:
+        prices = {change['product']: change['new_price'] for change in result['price_changes']}
+        items = list(cart.items.filter(product_id__in=prices))
+        for item in items:
+            item.price = prices[item.product_id]
+        CartItem.objects.bulk_update(items, ['price'])
+    return result
+
+
+def save_items(cart, items, replace=False):
+    """
+    Upsert [(product_id, quantity), ...] into `cart` at the current prices.
+
+    Quantity 0 removes a line; with `replace`, lines not listed are removed
+    too. Raises UnknownProducts, changing nothing, if a product to keep does
+    not exist (any more).
+    """
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[product_id] = quantity
+    keep = {product_id for product_id, quantity in quantities.items() if quantity > 0}
+
+    removed = cart.items.exclude(product_id__in=keep) if replace else cart.items.filter(
+        product_id__in=set(quantities) - keep)
+    with transaction.atomic():
+        prices = dict(Product.objects.filter(id__in=keep).values_list('id', 'price'))
+        missing = sorted(keep - set(prices))
+        if missing:
+            raise UnknownProducts(missing)
+        removed.delete()
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=product_id, quantity=quantities[product_id], price=prices[product_id])
+             for product_id in sorted(keep)],
+            update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity', 'price'],
+        )
+        cart.save(update_fields=['updated_at'])
+
+
+def parse_token(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def merge_guest_cart(token, user):
+    """
+    Move a guest cart's lines into `user`'s cart (quantities are added) and delete it.
+
+    Uses a fixed number of queries however many lines either cart has.
+    Returns the user's cart, or None if there was no guest cart to merge.
+    """
+    token = parse_token(token)
+    if token is None:
+        return None
+    with transaction.atomic():
+        guest = Cart.objects.select_for_update().filter(token=token, user__isnull=True).first()
+        if guest is None:
+            return None
+        cart, _ = Cart.objects.get_or_create(user=user)
+        existing = dict(cart.items.values_list('product_id', 'quantity'))
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=product_id, quantity=existing.get(product_id, 0) + quantity, price=price)
+             for product_id, quantity, price in cart_lines(guest)],
+            update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity', 'price'],
+        )
+        guest.delete()
+    return cart
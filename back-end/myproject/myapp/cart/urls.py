@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import CartView, CartValidateView
+
+
+urlpatterns = [
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/validate/', CartValidateView.as_view(), name='cart-validate'),
+]
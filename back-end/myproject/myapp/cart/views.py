@@ -0,0 +1,93 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Cart
+from .serializers import CartItemsSerializer, CartValidateSerializer
+from .services import (
+    CART_TOKEN_HEADER, UnknownProducts, parse_token, save_items, validate_cart, validate_items,
+)
+
+
+class CartMixin:
+    """
+    Resolves the cart for a request: the user's cart when authenticated,
+    otherwise the guest cart named by the X-Cart-Token header.
+    """
+    permission_classes = (AllowAny,)
+
+    def get_cart(self, create=False):
+        user = self.request.user
+        if user.is_authenticated:
+            if create:
+                return Cart.objects.get_or_create(user=user)[0]
+            return Cart.objects.filter(user=user).first()
+
+        token = parse_token(self.request.headers.get(CART_TOKEN_HEADER))
+        cart = Cart.objects.filter(token=token, user__isnull=True).first() if token else None
+        if cart is None and create:
+            cart = Cart.objects.create()
+        return cart
+
+    def cart_response(self, cart, result):
+        token = str(cart.token) if cart is not None and cart.user_id is None else None
+        headers = {CART_TOKEN_HEADER: token} if token else None
+        return Response({'token': token, **result}, headers=headers)
+
+
+class CartView(CartMixin, APIView):
+    @swagger_auto_schema(operation_description="The current cart, repriced and stock-checked.")
+    def get(self, request):
+        cart = self.get_cart()
+        return self.cart_response(cart, validate_cart(cart))
+
+    @swagger_auto_schema(request_body=CartItemsSerializer,
+                         operation_description="Replace the cart's lines. Guests get a cart token back.")
+    def put(self, request):
+        return self.save(request, replace=True)
+
+    @swagger_auto_schema(request_body=CartItemsSerializer,
+                         operation_description="Add or update lines; quantity 0 removes a line.")
+    def patch(self, request):
+        return self.save(request, replace=False)
+
+    def save(self, request, replace):
+        serializer = CartItemsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart(create=True)
+        try:
+            save_items(cart, [(item['product'], item['quantity']) for item in serializer.validated_data['items']],
+                       replace=replace)
+        except UnknownProducts as exc:
+            # Deleted after the serializer checked them.
+            return Response({'items': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return self.cart_response(cart, validate_cart(cart))
+
+    def delete(self, request):
+        cart = self.get_cart()
+        if cart is not None:
+            cart.items.all().delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartValidateView(CartMixin, APIView):
+    @swagger_auto_schema(
+        request_body=CartValidateSerializer,
+        operation_description=(
+            "Validate a whole cart in one request. With `items`, those lines are checked as given "
+            "(e.g. a browser-side cart); without, the stored cart is checked and its prices are "
+            "updated to the current ones."
+        ),
+    )
+    def post(self, request):
+        serializer = CartValidateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data.get('items')
+        if items is not None:
+            return Response(validate_items(
+                (item['product'], item['quantity'], item['price']) for item in items if item['quantity']
+            ))
+        cart = self.get_cart()
+        return self.cart_response(cart, validate_cart(cart, reprice=True))
@@ -0,0 +1,135 @@
+import io
+import logging
+from datetime import timedelta
+
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Image, Product
+from ..products.cache import bump_version
+from ..products.snapshots import rebuild_handler
+from . import blurhash
+from .services import get_image_options, storage_prefix
+
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:
+    PILImage = ImageOps = None
+
+
+logger = logging.getLogger(__name__)
+
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+BLURHASH_SIZE = 32
+
+
+def check_available():
+    if PILImage is None:
+        raise ImproperlyConfigured('Image processing requires Pillow (pip install Pillow).')
+
+
+def pillow_check(app_configs, **kwargs):
+    # Without Pillow every upload queues a processing job that can only fail.
+    if PILImage is None:
+        return [checks.Error('Image processing requires Pillow.', hint='pip install Pillow', id='myapp.E001')]
+    return []
+
+
+def claim(limit):
+    """
+    Mark up to `limit` pending images as processing and return them.
+
+    The status flip is a conditional update, so several workers can run
+    side by side without processing an image twice. Images whose worker
+    died mid-way (still processing after PROCESSING_TIMEOUT) are claimed
+    again.
+    """
+    now = timezone.now()
+    lapsed = now - timedelta(seconds=get_image_options()['PROCESSING_TIMEOUT'])
+    claimable = Q(status=Image.Status.PENDING) | Q(status=Image.Status.PROCESSING, claimed_at__lt=lapsed)
+    claimed = []
+    for image_id in list(Image.objects.filter(claimable).order_by('created_at').values_list('id', flat=True)[:limit]):
+        if Image.objects.filter(claimable, id=image_id).update(status=Image.Status.PROCESSING, claimed_at=now):
+            claimed.append(image_id)
+    return list(Image.objects.filter(id__in=claimed))
+
+
+def render_variants(image, source):
+    options = get_image_options()
+    variants = {}
+    for name, longest_side in options['VARIANTS'].items():
+        resized = source.copy()
+        resized.thumbnail((longest_side, longest_side), PILImage.LANCZOS)
+        variant = {'width': resized.width, 'height': resized.height}
+        for format in options['FORMATS']:
+            buffer = io.BytesIO()
+            resized.save(buffer, **SAVE_OPTIONS[format])
+            path = f'{storage_prefix(image.sha256)}/{name}.{EXTENSIONS[format]}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variant[format] = default_storage.save(path, ContentFile(buffer.getvalue()))
+        variants[name] = variant
+    return variants
+
+
+def process(image):
+    with image.original.open('rb') as file:
+        source = PILImage.open(file)
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    # WebP and JPEG variants have no alpha channel; flatten transparent images onto white.
+    if source.mode in ('RGBA', 'LA', 'P'):
+        source = source.convert('RGBA')
+        background = PILImage.new('RGB', source.size, (255, 255, 255))
+        background.paste(source, mask=source.getchannel('A'))
+        source = background
+    else:
+        source = source.convert('RGB')
+
+    small = source.resize((BLURHASH_SIZE, BLURHASH_SIZE), PILImage.BILINEAR)
+    image.blurhash = blurhash.encode(list(small.getdata()), BLURHASH_SIZE, BLURHASH_SIZE)
+    image.width, image.height = source.size
+    image.variants = render_variants(image, source)
+    image.status = Image.Status.READY
+    image.error = ''
+
+
+def process_pending(limit=20):
+    """Process up to `limit` pending images; returns (processed, failed)."""
+    check_available()
+    processed, failed, refs = 0, 0, []
+    for image in claim(limit):
+        try:
+            process(image)
+            processed += 1
+            refs.append(image.ref)
+        except Exception as exc:
+            logger.exception('Processing image %s failed', image.sha256)
+            image.status, image.error = Image.Status.FAILED, str(exc)
+            failed += 1
+        image.processed_at = timezone.now()
+        image.save(update_fields=['width', 'height', 'blurhash', 'variants', 'status', 'error', 'processed_at'])
+    if processed:
+        # Cached product responses embed the image URLs.
+        categories = using_categories(refs)
+        transaction.on_commit(lambda: bump_version(Product, categories))
+        rebuild_handler(Product)
+    return processed, failed
+
+
+def using_categories(refs):
+    """Ids of the categories with products showing any of the image `refs`."""
+    uses = Q(thumbnail__in=refs)
+    for ref in refs:
+        # Matches the ref inside the JSON text, which works on every backend.
+        uses |= Q(additional_images__icontains=ref)
+    return set(Product.objects.filter(uses).values_list('category_id', flat=True))
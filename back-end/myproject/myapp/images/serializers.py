@@ -0,0 +1,29 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from ..models import Image
+
+
+class ImageSerializer(serializers.ModelSerializer):
+    ref = serializers.CharField(read_only=True, help_text='Use this as a product thumbnail or additional image.')
+    url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Image
+        fields = ('id', 'ref', 'url', 'content_type', 'size', 'width', 'height', 'status', 'blurhash', 'variants')
+        read_only_fields = fields
+
+    def get_url(self, image):
+        return default_storage.url(image.original.name)
+
+    def get_variants(self, image):
+        return {
+            name: {key: default_storage.url(value) if key not in ('width', 'height') else value
+                   for key, value in variant.items()}
+            for name, variant in image.variants.items()
+        }
+
+
+class ImageUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
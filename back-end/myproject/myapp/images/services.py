@@ -0,0 +1,167 @@
+import base64
+import binascii
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from ..models import Image
+from ..tasks.services import enqueue
+
+
+REF_PREFIX = 'sha256:'
+PROCESS_TASK = 'images.process'
+REF_PATTERN = re.compile(r'^sha256:([0-9a-f]{64})$')
+DATA_URI_PATTERN = re.compile(r'^data:([\w/+.-]+)?(;[\w=.-]+)*;base64,(.*)$', re.DOTALL)
+
+# Leading bytes of each accepted format; the declared content type is never trusted.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def get_image_options():
+    return {
+        'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,
+        # Longest side in pixels of each generated variant.
+        'VARIANTS': {'thumb': 160, 'card': 480, 'large': 1200},
+        'FORMATS': ('webp', 'jpeg'),
+        'THUMBNAIL_VARIANT': 'card',
+        'GALLERY_VARIANT': 'large',
+        # Seconds after which an image still processing is taken to have lost its worker.
+        'PROCESSING_TIMEOUT': 600,
+        **getattr(settings, 'IMAGES', {}),
+    }
+
+
+def sniff(head):
+    """Return (content type, extension) for the first bytes of an image, or raise InvalidImage."""
+    for signature, content_type, extension in SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    raise InvalidImage('Unsupported image format; upload a JPEG, PNG, GIF or WebP file.')
+
+
+def storage_prefix(sha256):
+    # Content-addressed and sharded by the first byte, e.g. images/ab/abcdef.../
+    return f'images/{sha256[:2]}/{sha256}'
+
+
+def store_image(file):
+    """
+    Store an uploaded file (anything with .chunks(), e.g. UploadedFile) and return (Image, created).
+
+    The SHA-256 of the content is the image's identity, so uploading the same
+    bytes twice returns the existing Image and writes nothing.
+    """
+    max_size = get_image_options()['MAX_UPLOAD_SIZE']
+    digest, size, head = hashlib.sha256(), 0, b''
+    for chunk in file.chunks():
+        if len(head) < 16:
+            head += chunk[:16]
+        digest.update(chunk)
+        size += len(chunk)
+        if size > max_size:
+            raise InvalidImage(f'Images may be at most {max_size} bytes.')
+    content_type, extension = sniff(head)
+    sha256 = digest.hexdigest()
+
+    image = Image.objects.filter(sha256=sha256).first()
+    if image is not None:
+        return image, False
+
+    name = f'{storage_prefix(sha256)}/original.{extension}'
+    if not default_storage.exists(name):
+        file.seek(0)
+        name = default_storage.save(name, file)
+    try:
+        with transaction.atomic():
+            image = Image.objects.create(sha256=sha256, original=name, content_type=content_type, size=size)
+    except IntegrityError:
+        # Another request stored the same content first.
+        return Image.objects.get(sha256=sha256), False
+    enqueue(PROCESS_TASK, key=PROCESS_TASK)
+    return image, True
+
+
+def store_data_uri(value):
+    """Store a base64 `data:` URI as an Image; returns (Image, created)."""
+    match = DATA_URI_PATTERN.match(value)
+    if match is None:
+        raise InvalidImage('Only base64 encoded data URIs are supported.')
+    try:
+        content = base64.b64decode(match.group(3), validate=False)
+    except (binascii.Error, ValueError):
+        raise InvalidImage('Invalid base64 data.')
+    return store_image(ContentFile(content))
+
+
+def parse_ref(value):
+    match = REF_PATTERN.match(value) if isinstance(value, str) else None
+    return match.group(1) if match else None
+
+
+def product_refs(products):
+    refs = set()
+    for product in products:
+        values = [product.__dict__.get('thumbnail')] + list(product.__dict__.get('additional_images') or [])
+        refs.update(sha256 for sha256 in map(parse_ref, values) if sha256)
+    return refs
+
+
+def load_images(refs):
+    """Fetch {sha256: Image} for a set of digests in one query."""
+    if not refs:
+        return {}
+    images = Image.objects.filter(sha256__in=refs).only('sha256', 'original', 'status', 'blurhash', 'variants')
+    return {image.sha256: image for image in images}
+
+
+async def aload_images(refs):
+    if not refs:
+        return {}
+    images = Image.objects.filter(sha256__in=refs).only('sha256', 'original', 'status', 'blurhash', 'variants')
+    return {image.sha256: image async for image in images}
+
+
+def variant_url(image, variant, format=None):
+    format = format or get_image_options()['FORMATS'][0]
+    names = image.variants.get(variant) if image.status == Image.Status.READY else None
+    if names and format in names:
+        return default_storage.url(names[format])
+    return default_storage.url(image.original.name)
+
+
+def image_url(value, images, variant):
+    """
+    The URL to send to clients for a stored `thumbnail`/`additional_images` value.
+
+    References resolve to the variant (or the original until it has been
+    processed), plain URLs pass through and inline data URIs are dropped.
+    """
+    if not isinstance(value, str) or not value:
+        return None
+    sha256 = parse_ref(value)
+    if sha256 is None:
+        return None if value.startswith('data:') else value
+    image = images.get(sha256)
+    return variant_url(image, variant) if image is not None else None
+
+
+def inline_to_ref(value):
+    """Replace a data URI with a reference to a stored Image; other values are returned unchanged."""
+    if isinstance(value, str) and value.startswith('data:'):
+        return store_data_uri(value)[0].ref
+    return value
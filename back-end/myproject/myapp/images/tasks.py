@@ -0,0 +1,10 @@
+from ..tasks.services import task
+from .processing import process_pending
+from .services import PROCESS_TASK
+
+
+@task(PROCESS_TASK)
+def process_images(batch_size=20):
+    # Uploads queue one coalesced job; it works through everything pending.
+    while sum(process_pending(batch_size)) == batch_size:
+        pass
@@ -0,0 +1,8 @@
+from rest_framework.routers import SimpleRouter
+from .views import ImageViewSet
+
+
+router = SimpleRouter()
+router.register('images', ImageViewSet, basename='image')
+
+urlpatterns = router.urls
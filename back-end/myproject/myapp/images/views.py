@@ -0,0 +1,30 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import mixins, status, viewsets
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from ..models import Image
+from .serializers import ImageSerializer, ImageUploadSerializer
+from .services import InvalidImage, store_image
+
+
+class ImageViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Image.objects.all()
+    serializer_class = ImageSerializer
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    @swagger_auto_schema(
+        request_body=ImageUploadSerializer,
+        responses={201: ImageSerializer, 200: 'The same content was already uploaded', 400: 'Not an image'},
+    )
+    def create(self, request, *args, **kwargs):
+        upload = ImageUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        try:
+            image, created = store_image(upload.validated_data['file'])
+        except InvalidImage as exc:
+            return Response({'file': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(image).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
@@ -0,0 +1,163 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+current = ContextVar('request_metrics', default=None)
+
+
+def get_options():
+    return {'SAMPLE_RATE': 1.0, 'SERVER_TIMING': False, **getattr(settings, 'INSTRUMENTATION', {})}
+
+
+class RequestMetrics:
+    """Timings collected for one sampled request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; the context variable also follows queries that the async
+    # ORM runs in sync_to_async threads.
+    request_metrics = current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.add('db', time.perf_counter() - started)
+
+
+def install_query_recorder_handler(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to phase `name` of the current request, if it is sampled."""
+    request_metrics = current.get()
+    if request_metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.add(name, time.perf_counter() - started)
+
+
+def timed(name, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+# Request methods are client controlled; anything else is counted as 'other'
+# so made-up verbs cannot add label series without limit.
+KNOWN_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+
+def method_label(request):
+    return request.method if request.method in KNOWN_METHODS else 'other'
+
+
+def view_label(request):
+    """ViewClass.action (or ViewClass, or the function name) of the view that handled `request`."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if view_class is None:
+        return getattr(func, '__name__', match.view_name or 'unknown')
+    action = (getattr(func, 'actions', None) or {}).get(request.method.lower())
+    return f'{view_class.__name__}.{action}' if action else view_class.__name__
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, database queries and time, phase timings and response
+    size per view for a sample of requests (INSTRUMENTATION['SAMPLE_RATE']).
+
+    Results go to the Prometheus metrics served at /metrics and, with
+    INSTRUMENTATION['SERVER_TIMING'], to a Server-Timing response header.
+    Unsampled requests only increment a counter. Metrics are per process.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sample(self):
+        rate = get_options()['SAMPLE_RATE']
+        return RequestMetrics() if rate >= 1 or random.random() < rate else None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = self.sample()
+        if request_metrics is None:
+            response = self.get_response(request)
+        else:
+            token = current.set(request_metrics)
+            try:
+                response = self.get_response(request)
+            finally:
+                current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = self.sample()
+        if request_metrics is None:
+            response = await self.get_response(request)
+        else:
+            token = current.set(request_metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        view, method = view_label(request), method_label(request)
+        metrics.requests_total.inc((view, method, str(response.status_code)))
+        if request_metrics is None:
+            return response
+
+        total = time.perf_counter() - request_metrics.started
+        metrics.request_duration.observe(total, (view, method))
+        metrics.db_queries.observe(request_metrics.queries, (view,))
+        request_metrics.phases.setdefault('db', 0.0)
+        for name, seconds in request_metrics.phases.items():
+            metrics.phase_duration.observe(seconds, (view, name))
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), (view,))
+
+        if get_options()['SERVER_TIMING']:
+            entries = [f'total;dur={total * 1000:.2f}']
+            for name, seconds in request_metrics.phases.items():
+                description = f';desc="{request_metrics.queries} queries"' if name == 'db' else ''
+                entries.append(f'{name};dur={seconds * 1000:.2f}{description}')
+            response['Server-Timing'] = ', '.join(entries)
+        return response
@@ -0,0 +1,19 @@
+from .middleware import current, phase, timed
+
+
+class InstrumentedViewMixin:
+    """
+    Splits a DRF view's time into the `paginate` and `serialize` phases
+    reported by InstrumentationMiddleware. A no-op for unsampled requests.
+    """
+
+    def paginate_queryset(self, queryset):
+        with phase('paginate'):
+            return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if current.get() is not None:
+            # `.data` calls to_representation; many=True times the whole list once.
+            serializer.to_representation = timed('serialize', serializer.to_representation)
+        return serializer
@@ -0,0 +1,21 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metrics import CONTENT_TYPE, registry
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. With INSTRUMENTATION['METRICS_TOKEN'] set, requires
+    `Authorization: Bearer <token>`; otherwise only INSTRUMENTATION['METRICS_IPS'] may scrape.
+    """
+    options = getattr(settings, 'INSTRUMENTATION', {})
+    token = options.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in options.get('METRICS_IPS', ('127.0.0.1', '::1')):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
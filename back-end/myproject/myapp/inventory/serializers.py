@@ -0,0 +1,30 @@
+from rest_framework import serializers
+from ..models import Product, Reservation, ReservationItem
+
+
+class ReservationItemSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id')
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = ReservationItem
+        fields = ('product', 'quantity')
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    items = ReservationItemSerializer(many=True)
+
+    class Meta:
+        model = Reservation
+        fields = ('id', 'status', 'created_at', 'expires_at', 'items')
+        read_only_fields = ('status', 'created_at', 'expires_at')
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError('At least one item is required.')
+        product_ids = {item['product_id'] for item in items}
+        existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = sorted(product_ids - existing)
+        if missing:
+            raise serializers.ValidationError(f'Unknown products: {missing}')
+        return items
@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Product, Reservation, ReservationItem
+from ..products.cache import bump_version
+from ..products.facets import stock_changed
+from ..products.snapshots import rebuild_handler
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f'Not enough stock for products: {product_ids}')
+        self.product_ids = product_ids
+
+
+def take_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} with conditional updates.
+
+    Each row is changed by `UPDATE ... SET quantity = quantity - n WHERE
+    quantity >= n`, so concurrent buyers can never oversell. Rows are touched
+    in id order to avoid deadlocks between multi-item reservations. Must run
+    inside a transaction; raises InsufficientStock so the caller rolls back.
+    """
+    short = []
+    for product_id in sorted(quantities):
+        amount = quantities[product_id]
+        updated = Product.objects.filter(id=product_id, quantity__gte=amount).update(quantity=F('quantity') - amount)
+        if not updated:
+            short.append(product_id)
+    if short:
+        raise InsufficientStock(short)
+    stock_changed(sold_out=Product.objects.filter(id__in=list(quantities), quantity=0))
+    stock_written(quantities)
+
+
+def return_stock(quantities):
+    restocked = Q()
+    for product_id in sorted(quantities):
+        Product.objects.filter(id=product_id).update(quantity=F('quantity') + quantities[product_id])
+        restocked |= Q(id=product_id, quantity=quantities[product_id])
+    if quantities:
+        stock_changed(restocked=Product.objects.filter(restocked))
+        stock_written(quantities)
+
+
+def stock_written(product_ids):
+    # queryset.update() sends no signals: only the listings of these products' categories are stale.
+    categories = set(Product.objects.filter(id__in=list(product_ids)).values_list('category_id', flat=True))
+    transaction.on_commit(lambda: bump_version(Product, categories))
+    rebuild_handler(Product)
+
+
+def reserve(user, items, ttl=None):
+    """Reserve [(product_id, quantity), ...] for `user` in one transaction."""
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[product_id] += quantity
+
+    with transaction.atomic():
+        take_stock(quantities)
+        reservation = Reservation.objects.create(
+            user=user, expires_at=timezone.now() + (ttl or settings.RESERVATION_TTL),
+        )
+        ReservationItem.objects.bulk_create([
+            ReservationItem(reservation=reservation, product_id=product_id, quantity=quantity)
+            for product_id, quantity in sorted(quantities.items())
+        ])
+    return reservation
+
+
+def release(reservation_id, status=Reservation.Status.RELEASED):
+    """
+    Give a pending reservation's stock back. Returns False if it was no longer pending.
+
+    The status flip is itself a conditional update, so a reservation is
+    released at most once even when the sweeper and the buyer race.
+    """
+    with transaction.atomic():
+        updated = Reservation.objects.filter(id=reservation_id, status=Reservation.Status.PENDING).update(status=status)
+        if not updated:
+            return False
+        quantities = Counter()
+        for product_id, quantity in ReservationItem.objects.filter(reservation_id=reservation_id).values_list(
+                'product_id', 'quantity'):
+            quantities[product_id] += quantity
+        return_stock(quantities)
+    return True
+
+
+def confirm(reservation_id):
+    """Turn a pending, unexpired reservation into a permanent stock decrement."""
+    return bool(Reservation.objects.filter(
+        id=reservation_id, status=Reservation.Status.PENDING, expires_at__gt=timezone.now(),
+    ).update(status=Reservation.Status.CONFIRMED))
+
+
+def release_expired(limit=500):
+    """Release up to `limit` expired pending reservations and return how many were released."""
+    expired = Reservation.objects.filter(
+        status=Reservation.Status.PENDING, expires_at__lte=timezone.now(),
+    ).order_by('expires_at').values_list('id', flat=True)[:limit]
+    return sum(release(reservation_id, Reservation.Status.EXPIRED) for reservation_id in list(expired))
@@ -0,0 +1,8 @@
+from ..tasks.services import task
+from .services import release_expired
+
+
+@task('inventory.release_expired')
+def release_expired_reservations(batch_size=500):
+    while release_expired(batch_size) == batch_size:
+        pass
@@ -0,0 +1,45 @@
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ..instrumentation.mixins import InstrumentedViewMixin
+from ..models import Reservation
+from .serializers import ReservationSerializer
+from .services import InsufficientStock, confirm, release, reserve
+
+
+class ReservationViewSet(InstrumentedViewMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    serializer_class = ReservationSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Reservation.objects.filter(user=self.request.user).prefetch_related('items')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [(item['product_id'], item['quantity']) for item in serializer.validated_data['items']]
+        try:
+            reservation = reserve(request.user, items)
+        except InsufficientStock as exc:
+            return Response({'detail': 'Not enough stock.', 'products': exc.product_ids},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        reservation = self.get_object()
+        if not release(reservation.id):
+            return Response({'detail': f'Reservation is {reservation.status}.'}, status=status.HTTP_409_CONFLICT)
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
+
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        reservation = self.get_object()
+        if not confirm(reservation.id):
+            return Response({'detail': 'Reservation is no longer pending.'}, status=status.HTTP_409_CONFLICT)
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
@@ -0,0 +1,97 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """p50/p95/p99 (ms), mean and throughput for one run."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'rps': round((len(latencies) + errors) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+class HttpDriver:
+    """
+    Closed-loop HTTP load generator: `concurrency` threads, each with its own
+    keep-alive connection, issue requests back to back until `total` are done.
+    """
+
+    def __init__(self, base_url, concurrency=32, timeout=30):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.local.connection
+
+    def request(self, method, path, body=None, headers=None):
+        """Send one request; returns (status, body bytes), retrying once on a dropped connection."""
+        for attempt in range(2):
+            connection = self.connection()
+            try:
+                connection.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+    def run(self, make_request, total):
+        """
+        Call `make_request(driver, i)` `total` times across the worker threads.
+
+        `make_request` returns an HTTP status; anything >= 400 or an exception
+        counts as an error.
+        """
+        latencies, lock = [], threading.Lock()
+        errors = 0
+        counter = iter(range(total))
+
+        def worker():
+            nonlocal errors
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    failed = make_request(self, i) >= 400
+                except Exception:
+                    failed = True
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if failed:
+                        errors += 1
+                    else:
+                        latencies.append(elapsed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for _ in range(self.concurrency):
+                executor.submit(worker)
+        return summarize(latencies, errors, time.perf_counter() - started)
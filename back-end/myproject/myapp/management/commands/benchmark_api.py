@@ -0,0 +1,89 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from myapp.benchmark import HEADER, SCENARIOS, LocalServer, Suite, compare, current_commit, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a benchmark data set and run the browse, search, login, refresh and bulk_edit scenarios '
+        'against the API, reporting requests/second and p50/p95/p99 latency per endpoint.\n'
+        'Without --url the project is served in-process; for numbers that mean something, run the real '
+        'server (e.g. gunicorn -w 4 myproject.wsgi) against the same database and pass --url. '
+        'Bulk edits and logins write to the database, so point both at a scratch database.\n'
+        'The in-process server runs with login throttling off unless --throttle is given; start an external '
+        'server with THROTTLING_ENABLED=0 to do the same.\n'
+        'Save a report with --output and pass it to a later run as --baseline to compare commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server. Defaults to an in-process server.')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Run only these scenarios (repeatable). Defaults to all.')
+        parser.add_argument('--requests', type=int, default=500, help='Per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--throttle', action='store_true',
+                            help='Keep login and register throttling on for the in-process server.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the data set and the request mix.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='A previous --output report to compare p95 latency against.')
+        parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a table.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read --baseline: {exc}")
+
+        table = None if options['json'] else self.stdout
+        data = seed(options['categories'], options['products'], options['users'], options['seed'], stdout=table)
+        scenarios = options['scenario'] or SCENARIOS
+        if table:
+            table.write(HEADER)
+
+        if options['url']:
+            results = self.run(options['url'], data, scenarios, options, table)
+        else:
+            throttling = {**getattr(settings, 'THROTTLING', {}), 'ENABLED': options['throttle']}
+            with override_settings(THROTTLING=throttling), LocalServer() as server:
+                results = self.run(server.url, data, scenarios, options, table)
+
+        report = {
+            'commit': current_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'server': options['url'] or 'in-process',
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'data': {'categories': len(data['categories']), 'products': len(data['products']),
+                     'users': data['users'], 'seed': options['seed']},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif baseline:
+            self.stdout.write(f"\np95 against {baseline.get('commit') or options['baseline']}:")
+            for (scenario, endpoint), change in compare(baseline, results).items():
+                style = self.style.ERROR if change > 0.1 else self.style.SUCCESS if change < -0.1 else str
+                self.stdout.write(style(f'{scenario:<10} {endpoint:<36} {change:>+8.0%}'))
+
+    def run(self, url, data, scenarios, options, stdout):
+        suite = Suite(url, data, options['requests'], options['concurrency'], options['seed'])
+        return suite.run(scenarios, stdout)
@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from myapp.api.authentication import CachedJWTAuthentication, user_cache
+from myapp.api.views import UserViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/second on /account/info/ with the plain and the cached JWT authentication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user('benchmark-auth', password=None)
+            token = str(RefreshToken.for_user(user).access_token)
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+            original = UserViewSet.authentication_classes
+            try:
+                for authentication in (JWTAuthentication, CachedJWTAuthentication):
+                    UserViewSet.authentication_classes = [authentication]
+                    user_cache.delete(user.id)
+                    self.run(client, authentication.__name__, options['requests'])
+            finally:
+                UserViewSet.authentication_classes = original
+                user_cache.delete(user.id)
+                transaction.set_rollback(True)
+
+    def run(self, client, name, requests):
+        assert client.get('/account/info/').status_code == 200
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get('/account/info/')
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name:<24} {requests / elapsed:8.0f} req/s  {len(queries) / requests:.2f} queries/request'
+        )
@@ -0,0 +1,130 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from myapp.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the catalog up to --products rows, then report query plans and timings for the main '
+        'list/search queries without and with the Product indexes (dropped and rebuilt here). '
+        'Point it at a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query; the median is reported.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        self.connection = connections[self.using]
+        if options['interactive']:
+            answer = input(f"This adds up to {options['products']} products to {self.connection.settings_dict['NAME']} "
+                           f"and drops and rebuilds the product indexes. Type 'yes' to continue: ")
+            if answer != 'yes':
+                raise CommandError('Cancelled.')
+
+        self.seed(options['products'], options['categories'])
+        self.params = self.pick_params()
+
+        dropped = self.drop_indexes()
+        try:
+            before = self.measure(options['repeat'])
+        finally:
+            self.create_indexes(dropped)
+        after = self.measure(options['repeat'])
+
+        self.stdout.write(f"\n{'query':<28} {'before ms':>10} {'after ms':>10}")
+        for name in before:
+            self.stdout.write(f"{name:<28} {before[name][0]:>10.2f} {after[name][0]:>10.2f}")
+        for name in before:
+            self.stdout.write(f'\n== {name}\n-- before\n{before[name][1]}\n-- after\n{after[name][1]}')
+
+    def seed(self, products, categories):
+        existing = Product.objects.using(self.using).count()
+        category_ids = list(Category.objects.using(self.using).values_list('id', flat=True))
+        if len(category_ids) < categories:
+            created = Category.objects.using(self.using).bulk_create([
+                Category(name=f'Benchmark {i}') for i in range(len(category_ids), categories)
+            ])
+            category_ids += [category.id for category in created]
+
+        rng = random.Random(0)
+        batch_size = 10000
+        for start in range(existing, products, batch_size):
+            with transaction.atomic(using=self.using):
+                Product.objects.using(self.using).bulk_create([
+                    Product(name=f'Product {i:07d}', description=f'Benchmark product number {i}',
+                            price=round(rng.uniform(1, 1000), 2), quantity=rng.randint(0, 100),
+                            category_id=rng.choice(category_ids))
+                    for i in range(start, min(start + batch_size, products))
+                ])
+            self.stdout.write(f'\rseeded {min(start + batch_size, products)}/{products}', ending='')
+        self.stdout.write('')
+        self.analyze()
+
+    def pick_params(self):
+        products = Product.objects.using(self.using)
+        category_id = products.order_by('?').values_list('category_id', flat=True).first()
+        ids = products.filter(category_id=category_id).order_by('id').values_list('id', flat=True)
+        return {
+            'category_id': category_id,
+            'last_id': ids[ids.count() // 2],
+            'name_prefix': products.order_by('?').values_list('name', flat=True).first()[:-2],
+            'offset': products.count() // 2,
+        }
+
+    def queries(self):
+        products = Product.objects.using(self.using)
+        category_id, last_id, offset = self.params['category_id'], self.params['last_id'], self.params['offset']
+        return {
+            'category, by price': products.filter(category_id=category_id).order_by('price', 'id')[:20],
+            'category, keyset by id': products.filter(category_id=category_id, id__gt=last_id).order_by('id')[:20],
+            'category, price <= 100': products.filter(category_id=category_id, price__lte=100).order_by('-price', '-id')[:20],
+            'name prefix': products.filter(name__startswith=self.params['name_prefix']).order_by('name')[:20],
+            'list page, deep offset': products.order_by('id')[offset:offset + 20],
+        }
+
+    def measure(self, repeat):
+        results = {}
+        for name, queryset in self.queries().items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), queryset.explain())
+        return results
+
+    def existing_indexes(self):
+        with self.connection.cursor() as cursor:
+            constraints = self.connection.introspection.get_constraints(cursor, Product._meta.db_table)
+        return [index for index in Product._meta.indexes if index.name in constraints]
+
+    def drop_indexes(self):
+        dropped = self.existing_indexes()
+        with self.connection.schema_editor() as schema_editor:
+            for index in dropped:
+                schema_editor.remove_index(Product, index)
+        self.analyze()
+        return dropped
+
+    def create_indexes(self, indexes):
+        self.stdout.write(f'building {len(indexes)} indexes...')
+        with self.connection.schema_editor() as schema_editor:
+            for index in indexes:
+                started = time.perf_counter()
+                schema_editor.add_index(Product, index)
+                self.stdout.write(f'  {index.name}: {time.perf_counter() - started:.1f}s')
+        self.analyze()
+
+    def analyze(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if self.connection.vendor == 'sqlite' else f'ANALYZE {Product._meta.db_table}')
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myapp.benchmark import PAGE_SIZES, codings, measure_rendering
+
+
+class Command(BaseCommand):
+    help = (
+        'Render /products/ pages of 6, 100 and 10,000 products with each available renderer and report the '
+        'median render time and the response size, raw and per content coding (gzip, and brotli when the '
+        'Brotli package is installed). No database or server is involved.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, action='append',
+                            help='Page size to measure (repeatable). Defaults to 6, 100 and 10000.')
+        parser.add_argument('--repeats', type=int, default=20, help='Render rounds for pages of up to 100 items.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a table.')
+
+    def handle(self, *args, **options):
+        results = measure_rendering(options['size'] or PAGE_SIZES, options['repeats'], options['seed'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        compressed = [coding for coding in codings() if coding != 'identity']
+        self.stdout.write(f"{'items':>6} {'renderer':<20} {'render ms':>10} {'bytes':>10}" + ''.join(
+            f" {coding + ' bytes':>10} {coding + ' ms':>8}" for coding in compressed))
+        for size, renderers in results.items():
+            for name, stats in renderers.items():
+                self.stdout.write(f"{size:>6} {name:<20} {stats['render_ms']:>10} {stats['bytes']:>10}" + ''.join(
+                    f" {stats[coding + '_bytes']:>10} {stats[coding + '_ms']:>8}" for coding in compressed))
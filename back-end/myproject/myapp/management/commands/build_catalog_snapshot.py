@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from myapp.products.snapshots import SnapshotStore, build_snapshot, get_options
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the catalog snapshot: every page of the product listing, overall and per category, in each '
+        'keyset ordering. Only listings changed since the last build are redone unless --full is given. '
+        'Set CATALOG_SNAPSHOTS_ROOT to a directory every web worker can read.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every listing.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Then delete page files no listing uses any more (after PRUNE_AFTER seconds).')
+
+    def handle(self, *args, **options):
+        built = build_snapshot(full=options['full'], stdout=self.stdout)
+        self.stdout.write(f'Built {len(built)} listings.' if built else 'Snapshot is current.')
+        if options['prune']:
+            settings = get_options()
+            removed = SnapshotStore(settings['ROOT']).prune(settings['PRUNE_AFTER'])
+            self.stdout.write(f'Removed {removed} unused files.')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from myapp.api.blacklist import compact_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete outstanding and blacklisted tokens that are past their expiry (REFRESH_TOKEN_LIFETIME) '
+        'in small batches, then make every process rebuild its blacklist Bloom filter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, help='Keep running, compacting every INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = compact_expired(options['batch_size'])
+            if deleted or not options['interval']:
+                self.stdout.write(
+                    f'Deleted {deleted} expired tokens; {OutstandingToken.objects.count()} outstanding, '
+                    f'{BlacklistedToken.objects.count()} blacklisted remain.'
+                )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from myapp.products.bulk import FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Export every product as CSV or JSON Lines, streaming rows from the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file, or - for stdout.')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['format'], chunk_size=options['chunk_size'])
+        if options['path'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['path'], 'w', newline='', encoding='utf-8') as file:
+            file.writelines(lines)
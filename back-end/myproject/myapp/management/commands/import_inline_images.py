@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from myapp.images.services import InvalidImage, inline_to_ref
+from myapp.models import Product
+from myapp.products.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = ('Move base64 data URIs out of Product.thumbnail/additional_images into image storage, '
+            'replacing them with image references. Run process_images afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(
+            Q(thumbnail__startswith='data:') | Q(additional_images__icontains='data:'),
+        ).only('id', 'thumbnail', 'additional_images').order_by('id')
+
+        converted, failed, batch = 0, 0, []
+        for product in products.iterator(chunk_size=options['batch_size']):
+            try:
+                product.thumbnail = inline_to_ref(product.thumbnail)
+                if isinstance(product.additional_images, list):
+                    product.additional_images = [inline_to_ref(value) for value in product.additional_images]
+            except InvalidImage as exc:
+                self.stderr.write(f'Product {product.id}: {exc}')
+                failed += 1
+                continue
+            batch.append(product)
+            if len(batch) >= options['batch_size']:
+                converted += self.save(batch)
+                batch = []
+        converted += self.save(batch)
+        if converted:
+            bump_version(Product)
+        self.stdout.write(f'Converted {converted} products, {failed} failed.')
+
+    def save(self, batch):
+        # bulk_update skips save signals; the facet counters don't depend on these fields.
+        Product.objects.bulk_update(batch, ['thumbnail', 'additional_images'])
+        return len(batch)
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.products.bulk import FORMATS, ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or JSON Lines file, upserting rows that carry an id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create categories that do not exist yet instead of rejecting the row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if format not in FORMATS:
+            raise CommandError(f'Cannot tell the format of {path}; pass --format.')
+
+        importer = ProductImporter(batch_size=options['batch_size'], create_categories=options['create_categories'])
+        with open(path, newline='', encoding='utf-8') as file:
+            result = importer.run(read_rows(file, format))
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, failed {result['failed']}."
+        ))
@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.loadtest import HttpDriver
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare catalog read latency between running servers, e.g. WSGI and ASGI:\n'
+        '  gunicorn -w 4 myproject.wsgi -b 127.0.0.1:8000\n'
+        '  uvicorn --workers 4 myproject.asgi:application --port 8001\n'
+        '  manage.py loadtest_catalog --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL')
+        parser.add_argument('--path', action='append', metavar='PATH',
+                            help='Defaults to /products/, /products/?search=a, /categories/.')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000, help='Per target and path.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or ['/products/', '/products/?search=a', '/categories/']
+        results = {}
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep:
+                raise CommandError(f'--target must look like NAME=URL, got {target!r}.')
+            driver = HttpDriver(url, concurrency=options['concurrency'])
+            for path in paths:
+                make_request = lambda driver, i, path=path: driver.request('GET', path)[0]
+                results.setdefault(name, {})[path] = driver.run(make_request, options['requests'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'target':<8} {'path':<28} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+        for name, by_path in results.items():
+            for path, stats in by_path.items():
+                self.stdout.write(
+                    f"{name:<8} {path:<28} {stats['rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                    f"{stats['p99_ms']:>8} {stats['errors']:>7}"
+                )
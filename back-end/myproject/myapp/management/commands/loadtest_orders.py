@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import Sum
+
+from myapp.inventory.services import InsufficientStock
+from myapp.models import Category, Order, OrderItem, Product
+from myapp.orders.services import place_order
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent checkouts, resending some with the same idempotency key, and check that stock is '
+        'never oversold and no retry creates a second order. Creates its own products and users and removes '
+        'them afterwards; point it at a scratch (Postgres) database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=64, help='Concurrent threads, one user each.')
+        parser.add_argument('--orders', type=int, default=50, help='Checkouts per buyer.')
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--stock', type=int, default=1000, help='Initial quantity of each product.')
+        parser.add_argument('--items', type=int, default=3, help='Products per order.')
+        parser.add_argument('--retry-every', type=int, default=5, help='Resend every Nth checkout once.')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='Order load test')
+        products = Product.objects.bulk_create([
+            Product(name=f'Order load test {i}', description='', price=1.0 + i, quantity=options['stock'],
+                    category=category)
+            for i in range(options['products'])
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'loadtest-customer-{i}') for i in range(options['buyers'])
+        ])
+        counts = {'created': 0, 'replayed': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def buyer(number):
+            user = users[number]
+            try:
+                for attempt in range(options['orders']):
+                    # Buyers walk the products from different starting points, so orders overlap in every order.
+                    start = (number * 7 + attempt) % len(products)
+                    items = [(products[(start + i * 3) % len(products)].id, 1) for i in range(options['items'])]
+                    sends = 2 if options['retry_every'] and attempt % options['retry_every'] == 0 else 1
+                    for _ in range(sends):
+                        try:
+                            _, created = place_order(user, items, idempotency_key=f'{number}-{attempt}',
+                                                     request_hash=str(items))
+                            outcome = 'created' if created else 'replayed'
+                        except InsufficientStock:
+                            outcome = 'sold_out'
+                        except OperationalError:
+                            outcome = 'errors'
+                        with lock:
+                            counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['buyers']) as executor:
+            list(executor.map(buyer, range(options['buyers'])))
+        elapsed = time.perf_counter() - started
+
+        try:
+            orders = Order.objects.filter(user__in=users)
+            sold = OrderItem.objects.filter(order__in=orders).aggregate(total=Sum('quantity'))['total'] or 0
+            remaining = sum(Product.objects.filter(category=category).values_list('quantity', flat=True))
+            checkouts = sum(counts.values())
+            self.stdout.write(
+                f"{connections[DEFAULT_DB_ALIAS].vendor}: {checkouts} checkouts in {elapsed:.2f}s "
+                f"({checkouts / elapsed:.0f}/s) - created {counts['created']}, replayed {counts['replayed']}, "
+                f"sold out {counts['sold_out']}, errors {counts['errors']}; stock left {remaining}, "
+                f"sold {sold}"
+            )
+            if orders.count() != counts['created']:
+                raise CommandError('Retries created duplicate orders.')
+            if remaining + sold != options['stock'] * len(products):
+                raise CommandError('Stock does not match the orders.')
+            self.stdout.write(self.style.SUCCESS('Orders and stock are consistent.'))
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            category.delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
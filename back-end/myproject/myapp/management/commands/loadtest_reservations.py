@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from myapp.inventory.services import InsufficientStock, reserve
+from myapp.models import Category, Product, Reservation
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer the reservation service with concurrent buyers and check that stock is never oversold. '
+        'Creates its own products and user and removes them afterwards; point it at a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=32, help='Concurrent threads.')
+        parser.add_argument('--attempts', type=int, default=50, help='Reservations attempted per buyer.')
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--stock', type=int, default=500, help='Initial quantity of each product.')
+        parser.add_argument('--items', type=int, default=2, help='Products per reservation.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['database'] != DEFAULT_DB_ALIAS:
+            raise CommandError('The reservation service only writes to the default database.')
+
+        category = Category.objects.create(name='Load test')
+        products = [
+            Product.objects.create(name=f'Load test {i}', description='', price=1.0, quantity=options['stock'],
+                                   category=category)
+            for i in range(options['products'])
+        ]
+        user, _ = User.objects.get_or_create(username='loadtest-buyer')
+        counts = {'reserved': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def buyer(number):
+            try:
+                for attempt in range(options['attempts']):
+                    start = (number + attempt) % len(products)
+                    items = [(products[(start + i) % len(products)].id, 1) for i in range(options['items'])]
+                    try:
+                        reserve(user, items)
+                        outcome = 'reserved'
+                    except InsufficientStock:
+                        outcome = 'sold_out'
+                    except OperationalError:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['buyers']) as executor:
+            list(executor.map(buyer, range(options['buyers'])))
+        elapsed = time.perf_counter() - started
+
+        try:
+            remaining = sum(Product.objects.filter(category=category).values_list('quantity', flat=True))
+            expected = options['stock'] * len(products) - counts['reserved'] * options['items']
+            attempts = options['buyers'] * options['attempts']
+            self.stdout.write(
+                f"{connections[options['database']].vendor}: {attempts} attempts in {elapsed:.2f}s "
+                f"({attempts / elapsed:.0f}/s) - reserved {counts['reserved']}, sold out {counts['sold_out']}, "
+                f"errors {counts['errors']}; stock left {remaining}, expected {expected}"
+            )
+            if remaining != expected:
+                raise CommandError('Stock does not match the successful reservations.')
+            self.stdout.write(self.style.SUCCESS('Stock is consistent.'))
+        finally:
+            Reservation.objects.filter(user=user).delete()
+            category.delete()
+            user.delete()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.images.processing import process_pending
+
+
+class Command(BaseCommand):
+    help = ('Generate resized WebP/JPEG variants and blurhash placeholders for uploaded images. '
+            'Run from cron, or with --interval as a worker. Requires Pillow.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep running, polling every INTERVAL seconds.')
+        parser.add_argument('--batch-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = failed = 0
+            while True:
+                try:
+                    done, errors = process_pending(options['batch_size'])
+                except ImproperlyConfigured as exc:
+                    raise CommandError(str(exc))
+                processed, failed = processed + done, failed + errors
+                if done + errors < options['batch_size']:
+                    break
+            if processed or failed or not options['interval']:
+                self.stdout.write(f'Processed {processed} images, {failed} failed.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
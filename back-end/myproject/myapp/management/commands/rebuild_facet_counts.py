@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from myapp.models import Product
+from myapp.products.cache import bump_version
+from myapp.products.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the product facet counters (after changing CATALOG_PRICE_BUCKETS or writing with raw SQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        rows = rebuild_facet_counts(using=options['database'])
+        bump_version(Product)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} facet counters.'))
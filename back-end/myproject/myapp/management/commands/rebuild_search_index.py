@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from myapp.products.search import install_search_index, rebuild_search_index, search_supported
+
+
+class Command(BaseCommand):
+    help = 'Create the product full-text search index if needed and rebuild it from the product table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search_supported(connections[using]):
+            raise CommandError(f'Full-text search is not supported on {connections[using].vendor}.')
+        if not install_search_index(using):
+            rebuild_search_index(using)
+        self.stdout.write(self.style.SUCCESS('Product search index rebuilt.'))
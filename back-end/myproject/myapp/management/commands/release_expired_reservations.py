@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.inventory.services import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired, unconfirmed reservations. Run from cron, or with --interval as a sweeper.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep running, sweeping every INTERVAL seconds.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            released = 0
+            while True:
+                count = release_expired(options['batch_size'])
+                released += count
+                if count < options['batch_size']:
+                    break
+            if released or not options['interval']:
+                self.stdout.write(f'Released {released} expired reservations.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
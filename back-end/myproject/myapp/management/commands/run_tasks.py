@@ -0,0 +1,43 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from myapp.tasks.services import Worker, prune, run_pending
+
+
+def work():
+    worker = Worker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = ('Run queued background jobs (image processing, snapshot rebuilds, welcome emails, periodic '
+            'clean-ups). Workers finish their current job on SIGTERM/SIGINT.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to start.')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due, then exit.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            succeeded, failed = run_pending()
+            self.stdout.write(f'Ran {succeeded + failed} jobs, {failed} failed; pruned {prune()} finished jobs.')
+            return
+        if options['processes'] == 1:
+            work()
+            return
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        workers = [multiprocessing.Process(target=work, name=f'run_tasks-{number}')
+                   for number in range(options['processes'])]
+        for process in workers:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in workers])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in workers:
+            process.join()
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+import myapp.operations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('myapp', '0003_cart'),
+    ]
+
+    operations = [
+        myapp.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        myapp.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        myapp.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
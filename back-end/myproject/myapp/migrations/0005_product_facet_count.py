@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The buckets myapp.products.facets used when this migration was written; the
+# logic below is copied too, so later changes there cannot change this migration.
+DEFAULT_PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def fill_facet_counts(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Product = apps.get_model('myapp', 'Product')
+    ProductFacetCount = apps.get_model('myapp', 'ProductFacetCount')
+    buckets = tuple(getattr(settings, 'CATALOG_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+    bucket = models.Case(
+        *[models.When(price__lt=upper, then=models.Value(i)) for i, upper in enumerate(buckets[1:])],
+        default=models.Value(len(buckets) - 1), output_field=models.IntegerField(),
+    )
+    rows = Product.objects.using(using).annotate(bucket=bucket).values('category_id', 'bucket').annotate(
+        total=models.Count('id'), in_stock=models.Count('id', filter=models.Q(quantity__gt=0)),
+    ).order_by()
+    ProductFacetCount.objects.using(using).bulk_create([
+        ProductFacetCount(category_id=row['category_id'], price_bucket=row['bucket'],
+                          product_count=row['total'], in_stock_count=row['in_stock'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_product_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('product_count', models.IntegerField(default=0)),
+                ('in_stock_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='myapp.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'price_bucket'), name='unique_category_price_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_facet_counts, migrations.RunPython.noop),
+    ]
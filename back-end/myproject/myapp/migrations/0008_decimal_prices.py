@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def recompute_order_totals(apps, schema_editor):
+    # Totals were summed in floating point; redo them exactly from the converted item prices.
+    Order = apps.get_model('myapp', 'Order')
+    OrderItem = apps.get_model('myapp', 'OrderItem')
+    using = schema_editor.connection.alias
+    money = DecimalField(max_digits=14, decimal_places=2)
+    line_totals = OrderItem.objects.using(using).filter(order=OuterRef('pk')).values('order').annotate(
+        total=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=money)),
+    ).values('total')
+    Order.objects.using(using).update(total=Coalesce(Subquery(line_totals), Value(0), output_field=money))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'status'], name='order_created_status_idx'),
+        ),
+        migrations.RunPython(recompute_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+import myapp.operations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('myapp', '0008_decimal_prices'),
+    ]
+
+    operations = [
+        myapp.operations.AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity', 0)), fields=['id'], name='product_out_of_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
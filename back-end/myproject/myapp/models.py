@@ -9,6 +9,9 @@
 # def create_auth_token(sender, instance=None, created=False, **kwargs):
 #     if created:
 #         Token.objects.create(user=instance)
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -26,7 +29,7 @@ class Category(models.Model):
 class Product(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
-    price = models.FloatField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
     quantity = models.PositiveIntegerField()
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     thumbnail = models.TextField(null=True, blank=True)
@@ -37,5 +40,204 @@ class Product(models.Model):
 
     class Meta:
         verbose_name_plural = 'Products'
+        indexes = [
+            # Category pages sorted by price or id (and keyset pages over them).
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            # varchar_pattern_ops lets PostgreSQL use the index for `name LIKE 'prefix%'` under any
+            # collation; other backends ignore the opclass.
+            models.Index(fields=['name'], name='product_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # The admin's "out of stock" filter; a partial index stays small while most products are in stock.
+            models.Index(fields=['id'], condition=models.Q(quantity=0), name='product_out_of_stock_idx'),
+        ]
+
+
+class Image(models.Model):
+    """
+    An uploaded image, stored once per distinct content (keyed by SHA-256).
+
+    Products reference images as "sha256:<digest>" in `thumbnail` and
+    `additional_images`; the `images.process` task queued by the upload (or
+    `manage.py process_images`) fills in the resized variants and the
+    blurhash placeholder.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        PROCESSING = 'processing'
+        READY = 'ready'
+        FAILED = 'failed'
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.FileField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveIntegerField()
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True)
+    # {size name: {'width': w, 'height': h, 'webp': storage name, 'jpeg': storage name}}
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker took the image; processing that has not finished after IMAGES['PROCESSING_TIMEOUT'] is redone.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.ref
+
+    @property
+    def ref(self):
+        return f'sha256:{self.sha256}'
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+
+class ProductFacetCount(models.Model):
+    """
+    Denormalized product counts per (category, price bucket), kept up to date
+    by myapp.products.facets so facet counts never need a GROUP BY over Product.
+    """
+    category = models.ForeignKey(Category, related_name='facet_counts', on_delete=models.CASCADE)
+    # Index into settings.CATALOG_PRICE_BUCKETS; rebuild_facet_counts after changing the buckets.
+    price_bucket = models.PositiveSmallIntegerField()
+    product_count = models.IntegerField(default=0)
+    in_stock_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.category_id}/{self.price_bucket}: {self.product_count}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'price_bucket'], name='unique_category_price_bucket'),
+        ]
+
+
+class Reservation(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        CONFIRMED = 'confirmed'
+        RELEASED = 'released'
+        EXPIRED = 'expired'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='reservations', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'Reservation {self.pk} ({self.status})'
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+
+class ReservationItem(models.Model):
+    reservation = models.ForeignKey(Reservation, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservation_items', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id}'
+
 
+class Cart(models.Model):
+    """A user's cart, or a guest cart identified only by `token` until it is merged at login."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='cart', null=True, blank=True,
+                                on_delete=models.CASCADE)
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    def __str__(self):
+        return f'Cart {self.pk}'
+
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='cart_items', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    # The price the shopper last saw; compared with Product.price to report drift.
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id}'
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product')]
+
+
+class Order(models.Model):
+    class Status(models.TextChoices):
+        PLACED = 'placed'
+        CANCELLED = 'cancelled'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='orders', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PLACED)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    # The client's Idempotency-Key, and a fingerprint of the request first sent with it.
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    request_hash = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Order {self.pk} ({self.status})'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # Date ranges in the sales report.
+            models.Index(fields=['created_at', 'status'], name='order_created_status_idx'),
+        ]
+
+
+class OrderItem(models.Model):
+    """One ordered product, with its name and price as they were at checkout."""
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='order_items', null=True, on_delete=models.SET_NULL)
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.quantity} x {self.name}'
+
+
+class Job(models.Model):
+    """
+    A queued call of a background task (see myapp.tasks), run by `manage.py run_tasks`.
+
+    Jobs with the same `key` are coalesced: while one is pending, enqueueing
+    another is a no-op.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    # The claim holding a running job, and when it lapses (a worker that died mid-job).
+    claim = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.task} {self.pk} ({self.status})'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='pending'), name='unique_pending_job_key'),
+        ]
+        indexes = [models.Index(fields=['status', 'run_at'])]
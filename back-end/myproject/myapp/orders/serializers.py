@@ -0,0 +1,36 @@
+from rest_framework import serializers
+
+from ..cart.serializers import MAX_CART_LINES
+from ..models import Order, OrderItem, Product
+
+
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderCreateSerializer(serializers.Serializer):
+    items = OrderLineSerializer(many=True, max_length=MAX_CART_LINES, allow_empty=False, required=False,
+                                help_text="Defaults to the lines in the user's cart.")
+
+    def validate_items(self, items):
+        product_ids = {item['product'] for item in items}
+        existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = sorted(product_ids - existing)
+        if missing:
+            raise serializers.ValidationError(f'Unknown products: {missing}')
+        return items
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ('product', 'name', 'price', 'quantity')
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'status', 'total', 'created_at', 'items')
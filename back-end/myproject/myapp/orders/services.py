@@ -0,0 +1,129 @@
+import hashlib
+import json
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from ..cart.services import cart_lines
+from ..inventory.services import InsufficientStock
+from ..models import Cart, CartItem, Order, OrderItem, Product
+from ..products.cache import bump_version
+from ..products.snapshots import rebuild_handler
+from ..products.facets import stock_changed
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(Exception):
+    """The Idempotency-Key was already used for a different request."""
+
+    def __init__(self, order):
+        super().__init__(f'Idempotency key already used for order {order.pk}')
+        self.order = order
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def find_order(user, idempotency_key, request_hash):
+    """The order an earlier request with this key created, if any; raises if that request was different."""
+    if not idempotency_key:
+        return None
+    order = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    if order is not None and order.request_hash != request_hash:
+        raise IdempotencyKeyReused(order)
+    return order
+
+
+def combine(items):
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def create_order(user, quantities, idempotency_key=None, request_hash='', cart=None):
+    """
+    Take stock and write the order; must run inside a transaction.
+
+    The products are locked with one `SELECT ... FOR UPDATE` in id order, so
+    concurrent checkouts sharing products queue up instead of deadlocking.
+    Stock is decremented with one bulk UPDATE and the items are inserted with
+    one bulk INSERT, so the query count does not grow with the order size.
+    """
+    products = list(
+        Product.objects.select_for_update().filter(id__in=list(quantities)).order_by('id')
+        .only('id', 'name', 'price', 'quantity', 'category_id')
+    )
+    found = {product.id for product in products}
+    short = sorted(set(quantities) - found)
+    short += [product.id for product in products if product.quantity < quantities[product.id]]
+    if short:
+        raise InsufficientStock(sorted(short))
+
+    for product in products:
+        product.quantity -= quantities[product.id]
+    Product.objects.bulk_update(products, ['quantity'])
+    sold_out = [product.id for product in products if product.quantity == 0]
+    if sold_out:
+        stock_changed(sold_out=Product.objects.filter(id__in=sold_out))
+    categories = {product.category_id for product in products}
+    transaction.on_commit(lambda: bump_version(Product, categories))
+    rebuild_handler(Product)
+
+    order = Order.objects.create(
+        user=user, idempotency_key=idempotency_key or None, request_hash=request_hash,
+        total=sum(product.price * quantities[product.id] for product in products),
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=product.id, name=product.name, price=product.price,
+                  quantity=quantities[product.id])
+        for product in products
+    ])
+    if cart is not None:
+        CartItem.objects.filter(cart=cart, product_id__in=found).delete()
+    return order
+
+
+def place_order(user, items, idempotency_key=None, request_hash='', cart=None):
+    """
+    Order [(product_id, quantity), ...] for `user` in one transaction; returns (order, created).
+
+    With an idempotency key, a retry returns the order the first attempt
+    created. Two attempts racing with the same key are settled by the unique
+    (user, idempotency_key) constraint: the loser rolls back, stock included,
+    and returns the winner's order. `cart`, if given, loses the ordered lines.
+    """
+    existing = find_order(user, idempotency_key, request_hash)
+    if existing is not None:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            order = create_order(user, combine(items), idempotency_key, request_hash, cart)
+    except IntegrityError:
+        existing = find_order(user, idempotency_key, request_hash)
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
+
+
+def checkout_cart(user, idempotency_key=None, request_hash=''):
+    """Order everything in the user's cart and remove those lines from it."""
+    # A retry must find its order before looking at the cart the first attempt emptied.
+    existing = find_order(user, idempotency_key, request_hash)
+    if existing is not None:
+        return existing, False
+    cart = Cart.objects.filter(user=user).first()
+    lines = [(product_id, quantity) for product_id, quantity, _ in cart_lines(cart)] if cart else []
+    if not lines:
+        raise EmptyCart
+    return place_order(user, lines, idempotency_key, request_hash, cart=cart)
@@ -0,0 +1,54 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import mixins, status, viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ..instrumentation.mixins import InstrumentedViewMixin
+from ..inventory.services import InsufficientStock
+from ..models import Order
+from .serializers import OrderCreateSerializer, OrderSerializer
+from .services import (
+    IDEMPOTENCY_KEY_HEADER, MAX_IDEMPOTENCY_KEY_LENGTH, EmptyCart, IdempotencyKeyReused, checkout_cart, fingerprint,
+    place_order,
+)
+
+
+class OrderViewSet(InstrumentedViewMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                   viewsets.GenericViewSet):
+    serializer_class = OrderSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).prefetch_related('items').order_by('-id')
+
+    @swagger_auto_schema(request_body=OrderCreateSerializer, responses={201: OrderSerializer},
+                         operation_description='Place an order for `items`, or for the cart when they are omitted. '
+                                               'Send an Idempotency-Key header so retries return the same order.')
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER) or None
+        if key is not None and len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response({'detail': f'{IDEMPOTENCY_KEY_HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = OrderCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        request_hash = fingerprint(serializer.validated_data)
+
+        try:
+            order, created = self.place(request.user, serializer.validated_data, key, request_hash)
+        except IdempotencyKeyReused:
+            return Response({'detail': f'{IDEMPOTENCY_KEY_HEADER} was already used for a different request.'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except InsufficientStock as exc:
+            return Response({'detail': 'Not enough stock.', 'products': exc.product_ids},
+                            status=status.HTTP_409_CONFLICT)
+        except EmptyCart:
+            return Response({'detail': 'The cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        order = self.get_queryset().get(pk=order.pk)
+        if created:
+            return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(self.get_serializer(order).data, headers={'Idempotent-Replayed': 'true'})
+
+    def place(self, user, data, key, request_hash):
+        if 'items' in data:
+            return place_order(user, [(item['product'], item['quantity']) for item in data['items']], key, request_hash)
+        return checkout_cart(user, key, request_hash)
@@ -0,0 +1,116 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.utils.encoders import JSONEncoder
+
+from ..images.services import aload_images, product_refs
+from ..instrumentation.middleware import phase
+from ..models import Product
+from ..routers import replica_reads
+from .snapshots import get_options as get_snapshot_options, snapshot_response
+from .views import CategoriesView, ProductViewSet
+
+
+# Async read path for the catalog under ASGI (ASYNC_CATALOG_VIEWS). GET requests
+# reuse the DRF views' query building (search, sparse fields, pagination) and
+# response cache, but evaluate queries with the async ORM. Every other method
+# is handed to the sync DRF view, so writes behave exactly as before.
+
+
+def build_view(view_class, request, action, **kwargs):
+    view = view_class()
+    view.action = action
+    view.action_map = {'get': action}
+    view.args, view.kwargs = (), kwargs
+    view.format_kwarg = None
+    view.headers = {}
+    view.request = view.initialize_request(request, **kwargs)
+    return view
+
+
+def error_response(exc):
+    """The response DRF's exception handler sends for `exc`: field errors keep their shape."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, encoder=JSONEncoder, safe=False)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCatalogView(View):
+    """Base for the async catalog views; subclasses define `get` and the sync `fallback` view."""
+    fallback = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+        try:
+            with replica_reads():
+                return await self.get(request, *args, **kwargs)
+        except APIException as exc:
+            return error_response(exc)
+
+    async def get_serializer_context(self, view, rows):
+        """Anything the serializer would otherwise query for has to be loaded here, asynchronously."""
+        return view.get_serializer_context()
+
+    async def serialize(self, view, rows, many=True):
+        context = await self.get_serializer_context(view, rows if many else [rows])
+        with phase('serialize'):
+            return view.get_serializer(rows, many=many, context=context).data
+
+    async def list(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        with phase('paginate'):
+            page = await paginator.apaginate_queryset(queryset, view.request, view=view)
+        if page is None:
+            return await self.serialize(view, [row async for row in queryset.aiterator()])
+        return paginator.get_paginated_data(await self.serialize(view, page))
+
+
+class AsyncProductView(AsyncCatalogView):
+    async def get_serializer_context(self, view, rows):
+        return {**view.get_serializer_context(), 'images': await aload_images(product_refs(rows))}
+
+
+class AsyncProductListView(AsyncProductView):
+    fallback = staticmethod(ProductViewSet.as_view({'get': 'list', 'post': 'create'}))
+
+    async def get(self, request):
+        view = build_view(ProductViewSet, request, 'list')
+        if get_snapshot_options()['ENABLED']:
+            response = await sync_to_async(snapshot_response)(view, view.request)
+            if response is not None:
+                return response
+        return await view.acached_response(lambda: self.list(view), view.request, 'list')
+
+
+class AsyncProductDetailView(AsyncProductView):
+    fallback = staticmethod(ProductViewSet.as_view({
+        'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+    }))
+
+    async def get(self, request, pk):
+        view = build_view(ProductViewSet, request, 'retrieve', pk=pk)
+
+        async def retrieve():
+            try:
+                product = await view.filter_queryset(view.get_queryset()).aget(pk=pk)
+            except (Product.DoesNotExist, ValueError):
+                return JsonResponse({'detail': 'No Product matches the given query.'}, status=404)
+            return await self.serialize(view, product, many=False)
+
+        return await view.acached_response(retrieve, view.request, 'retrieve')
+
+
+class AsyncCategoriesView(AsyncCatalogView):
+    fallback = staticmethod(CategoriesView.as_view())
+
+    async def get(self, request):
+        view = build_view(CategoriesView, request, 'list')
+        return await view.acached_response(lambda: self.list(view), view.request, 'list')
@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+from collections import Counter
+
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from rest_framework import serializers
+
+from ..images.services import InvalidImage, inline_to_ref
+from ..models import Product, Category
+from .cache import bump_version
+from .facets import apply_deltas, facet_key
+from .serializers import PriceField
+from .snapshots import rebuild_handler
+
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_FIELDS = ('id', 'name', 'description', 'price', 'quantity', 'category', 'thumbnail', 'additional_images')
+UPDATE_FIELDS = ['name', 'description', 'price', 'quantity', 'category', 'thumbnail', 'additional_images']
+MAX_REPORTED_ERRORS = 100
+
+
+class ProductRowSerializer(serializers.Serializer):
+    """One imported product. `category` is a category name (or id); no database lookups happen here."""
+    id = serializers.IntegerField(required=False, min_value=1)
+    name = serializers.CharField(max_length=100)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    price = PriceField()
+    quantity = serializers.IntegerField(min_value=0)
+    category = serializers.CharField(max_length=100)
+    thumbnail = serializers.CharField(required=False, allow_null=True, allow_blank=True, default=None)
+    additional_images = serializers.JSONField(required=False, allow_null=True, default=None)
+
+    def validate_additional_images(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise serializers.ValidationError('Invalid JSON.')
+        if value is not None and not isinstance(value, list):
+            raise serializers.ValidationError('Expected a list of images.')
+        return value
+
+
+def content_type_format(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    for name, value in CONTENT_TYPES.items():
+        if content_type == value:
+            return name
+    if content_type in ('application/jsonl', 'application/json-lines'):
+        return 'jsonl'
+    return None
+
+
+def read_rows(lines, format):
+    """Yield (line number, row dict) pairs from an iterable of text lines."""
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value != ''}
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+class ProductImporter:
+    """
+    Validate and write products in batches.
+
+    Categories are resolved from a single preloaded name -> id map, rows are
+    validated and written a batch at a time and each batch is one upsert
+    (`bulk_create(update_conflicts=True)`) in its own transaction. Invalid rows
+    are skipped and reported; valid batches are kept, even when reading the
+    rows fails part way through.
+    """
+
+    def __init__(self, batch_size=1000, create_categories=False):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.categories = {}
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.explicit_ids = False
+        self.written_categories = set()
+
+    def run(self, rows):
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.category_ids = set(self.categories.values())
+
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        finally:
+            if self.explicit_ids:
+                self.reset_sequence()
+            if self.created or self.updated:
+                bump_version(Product, self.written_categories)
+                rebuild_handler(Product)
+        return self.result()
+
+    def reset_sequence(self):
+        # Rows inserted with their own ids don't advance PostgreSQL's id sequence,
+        # so the next regular insert would collide with them.
+        connection = connections[router.db_for_write(Product)]
+        statements = connection.ops.sequence_reset_sql(no_style(), [Product])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def result(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.error_count,
+            'errors': self.errors,
+        }
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def resolve_category(self, value):
+        if value in self.categories:
+            return self.categories[value]
+        if value.isdigit() and int(value) in self.category_ids:
+            return int(value)
+        if self.create_categories:
+            category = Category.objects.create(name=value)
+            self.categories[value] = category.id
+            self.category_ids.add(category.id)
+            return category.id
+        return None
+
+    def import_batch(self, batch):
+        products = []
+        for line, row in batch:
+            if not isinstance(row, dict):
+                self.add_error(line, {'non_field_errors': ['Invalid JSON object.']})
+                continue
+            serializer = ProductRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.add_error(line, serializer.errors)
+                continue
+            data = dict(serializer.validated_data)
+            try:
+                data['thumbnail'] = inline_to_ref(data['thumbnail'])
+                if data['additional_images'] is not None:
+                    data['additional_images'] = [inline_to_ref(item) for item in data['additional_images']]
+            except InvalidImage as exc:
+                self.add_error(line, {'non_field_errors': [str(exc)]})
+                continue
+            category_id = self.resolve_category(data.pop('category'))
+            if category_id is None:
+                self.add_error(line, {'category': ['Unknown category.']})
+                continue
+            products.append(Product(category_id=category_id, **data))
+
+        if not products:
+            return
+
+        # The last row wins when a batch repeats an id; one upsert can't touch a row twice.
+        by_id = {product.id: product for product in products if product.id}
+        products = [product for product in products if not product.id] + list(by_id.values())
+        ids = list(by_id)
+        with transaction.atomic():
+            before = Product.objects.filter(id__in=ids).values_list('category_id', 'price', 'quantity') if ids else []
+            # bulk_create sends no signals, so the facet counters are moved here.
+            deltas = Counter(facet_key(product.category_id, product.price, product.quantity) for product in products)
+            deltas.subtract(facet_key(*row) for row in before)
+            existing = len(before)
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS,
+            )
+            apply_deltas(deltas)
+        # Both the categories rows were moved out of and the ones they are in now.
+        self.written_categories.update(product.category_id for product in products)
+        self.written_categories.update(category_id for category_id, _, _ in before)
+        self.updated += existing
+        self.created += len(products) - existing
+        self.explicit_ids = self.explicit_ids or len(ids) > existing
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('id').values_list(
+        'id', 'name', 'description', 'price', 'quantity', 'category__name', 'thumbnail', 'additional_images',
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def export_lines(format, queryset=None, chunk_size=2000):
+    """Yield the serialized export one line at a time."""
+    if format == 'jsonl':
+        # Prices as strings, like the CSV: a float may not read back as the same Decimal.
+        for row in export_rows(queryset, chunk_size):
+            yield json.dumps(row, default=str) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset, chunk_size):
+        if row['additional_images'] is not None:
+            row['additional_images'] = json.dumps(row['additional_images'])
+        writer.writerow(row.values())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
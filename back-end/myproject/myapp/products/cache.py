@@ -0,0 +1,244 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.response import Response
+
+from ..models import Product, Category
+from ..routers import pin_if_recent
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def version_key(model):
+    return f'catalog:version:{model._meta.label_lower}'
+
+
+def category_version_key(category_id):
+    """Version of the product listing of one category; 'all' is the unfiltered listing."""
+    return f'catalog:version:category:{category_id}'
+
+
+# Bumped by writes that may have touched any category's products.
+EVERY_CATEGORY_KEY = 'catalog:version:category:*'
+
+
+def read_versions(keys):
+    """
+    Return the current version under each key.
+
+    A version is the time (in ns) of the last write it covers, so it also
+    serves as Last-Modified and never repeats if the cache loses the counter.
+    """
+    cache = get_catalog_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_versions(models):
+    """Return the current version of each model."""
+    return read_versions([version_key(model) for model in models])
+
+
+async def aget_versions(models):
+    cache = get_catalog_cache()
+    keys = [version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def get_category_versions(category_ids):
+    """[every-category version, listing version] for each category id (or 'all'), for catalog snapshots."""
+    keys = [EVERY_CATEGORY_KEY] + [category_version_key(id) for id in category_ids]
+    every, *versions = read_versions(keys)
+    return [[every, version] for version in versions]
+
+
+def bump_version(model, categories=None):
+    """
+    Start a new version of `model`, so cached responses built from it are no longer used.
+
+    `categories` are the ids of the categories whose product listings the
+    write changed (both, for a product moved between categories), or () if
+    it changed none. The default, None, means unknown: every listing is stale.
+    """
+    keys = [version_key(model)]
+    if categories is None:
+        keys.append(EVERY_CATEGORY_KEY)
+    elif categories:
+        keys += [category_version_key(id) for id in {*categories, 'all'}]
+    get_catalog_cache().set_many(dict.fromkeys(keys, time.time_ns()), timeout=None)
+
+
+def category_written_handler(sender, **kwargs):
+    # Category rows are not part of product listings, bar ?expand=category, which snapshots do not serve.
+    bump_version(sender, categories=())
+
+
+def product_written_handler(sender, instance, **kwargs):
+    # The facet pre_save handler remembers which category the product was in before this save.
+    before = getattr(instance, '_facet_key', None)
+    categories = {instance.category_id, *(before[:1] if before else ())}
+    bump_version(sender, categories)
+    # Again once committed: a snapshot built between the first bump and the
+    # commit would carry the new version but not the new row.
+    transaction.on_commit(lambda: bump_version(sender, categories))
+
+
+class CachedResponseMixin:
+    """
+    Cache list/retrieve response data until a cached model is written.
+
+    Keys are built from the action, the URL kwargs, the normalized query
+    parameters that affect the response and the current model versions, so a
+    write makes every old entry unreachable instead of deleting it. Responses
+    carry an ETag and Last-Modified; revalidation with a 304 goes by the ETag.
+    """
+    cache_models = (Product, Category)
+    cache_query_params = ('limit', 'offset', 'search', 'cursor', 'pagination', 'count', 'ordering', 'fields', 'expand')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_query(self, request):
+        query = []
+        for param in self.cache_query_params:
+            for value in sorted(request.query_params.getlist(param)):
+                if param == 'search':
+                    value = ' '.join(value.lower().split())
+                elif param in ('fields', 'expand'):
+                    value = ','.join(sorted({item.strip() for item in value.split(',') if item.strip()}))
+                query.append(f'{param}={value}')
+        return '&'.join(query)
+
+    def get_response_cache_key(self, request, action, versions, kwargs=None):
+        kwargs = self.kwargs if kwargs is None else kwargs
+        parts = [
+            type(self).__name__,
+            action,
+            ','.join(f'{name}={value}' for name, value in sorted(kwargs.items())),
+            request.get_host(),
+            self.get_cache_query(request),
+            ','.join(str(version) for version in versions),
+        ]
+        return 'catalog:response:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def get_validators(self, key, versions):
+        # Rounded up to the second, so Last-Modified is never before the write it covers.
+        return f'W/"{key.rsplit(":", 1)[1]}"', -(-max(versions) // 1_000_000_000)
+
+    def get_not_modified(self, request, etag):
+        # Only the ETag is compared. Last-Modified has one-second resolution, so a
+        # second write in the same second would still pass If-Modified-Since.
+        return get_conditional_response(request, etag=etag)
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        # The same data can be rendered as JSON or MessagePack.
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def select_data_renderer(self, request):
+        """Negotiate among the renderers that need no Response or template (everything but the browsable API)."""
+        renderers = [renderer for renderer in self.get_renderers() if renderer.format != 'api']
+        try:
+            return self.get_content_negotiator().select_renderer(request, renderers, self.format_kwarg)
+        except NotAcceptable:
+            # Only the browsable API matched, or nothing did: answer JSON, as this path always has.
+            return renderers[0], renderers[0].media_type
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        versions = get_versions(self.cache_models)
+        pin_if_recent(max(versions))
+        key = self.get_response_cache_key(request, handler.__name__, versions)
+        etag, last_modified = self.get_validators(key, versions)
+
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        cache = get_catalog_cache()
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+        else:
+            response = Response(data)
+        return self.set_validators(response, etag, last_modified)
+
+    def cached_retrieve_many(self, request, ids, load):
+        """
+        Retrieve response data for each of `ids`, from the entries `retrieve`
+        would use for `/<id>/` with the same query parameters; returns {id: data}.
+
+        Ids missing from the cache are passed to `load` in one call, which
+        returns [(id, data), ...] for the ones that exist; those are cached in
+        one round trip, so a later retrieve of the same product is a hit too.
+        """
+        versions = get_versions(self.cache_models)
+        pin_if_recent(max(versions))
+        keys = {id: self.get_response_cache_key(request, 'retrieve', versions, {'pk': id}) for id in ids}
+        cache = get_catalog_cache()
+        cached = cache.get_many(list(keys.values()))
+        found = {id: cached[key] for id, key in keys.items() if key in cached}
+
+        misses = [id for id in ids if id not in found]
+        if misses:
+            loaded = dict(load(misses))
+            cache.set_many({keys[id]: data for id, data in loaded.items()},
+                           getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+            found.update(loaded)
+        return found
+
+    async def acached_response(self, handler, request, action):
+        """
+        Async counterpart of cached_response for the ASGI views; shares its cache entries.
+
+        `handler` is a coroutine function returning the response data, or an
+        HttpResponse for anything that should not be cached.
+        """
+        versions = await aget_versions(self.cache_models)
+        pin_if_recent(max(versions))
+        key = self.get_response_cache_key(request, action, versions)
+        etag, last_modified = self.get_validators(key, versions)
+
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        cache = get_catalog_cache()
+        data = await cache.aget(key)
+        if data is None:
+            data = await handler()
+            if isinstance(data, HttpResponseBase):
+                return data
+            await cache.aset(key, data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+        renderer, media_type = self.select_data_renderer(request)
+        response = HttpResponse(renderer.render(data, media_type, {'request': request, 'view': self}),
+                                content_type=media_type)
+        return self.set_validators(response, etag, last_modified)
@@ -0,0 +1,176 @@
+from bisect import bisect_right
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.lookups import LessThan
+
+from ..models import Category, Product, ProductFacetCount
+
+
+DEFAULT_PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+FACET_FIELDS = {'category', 'category_id', 'price', 'quantity'}
+
+
+def get_price_buckets():
+    return tuple(getattr(settings, 'CATALOG_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def price_bucket(price, buckets=None):
+    """Index of the bucket [buckets[i], buckets[i + 1]) holding `price`; the last bucket is open-ended."""
+    return max(0, bisect_right(buckets or get_price_buckets(), price) - 1)
+
+
+def facet_key(category_id, price, quantity):
+    return category_id, price_bucket(price), quantity > 0
+
+
+def apply_deltas(deltas, using=DEFAULT_DB_ALIAS):
+    """
+    Apply {(category_id, price_bucket, in_stock): product count delta} to the counter table.
+
+    Each counter is moved with an `UPDATE ... SET n = n + delta`, so
+    concurrent writers never lose increments. Rows are only created for
+    positive deltas, so deleting the products of a deleted category cannot
+    resurrect its counters.
+    """
+    rows = {}
+    for (category_id, bucket, in_stock), delta in deltas.items():
+        counts = rows.setdefault((category_id, bucket), Counter())
+        counts['product_count'] += delta
+        if in_stock:
+            counts['in_stock_count'] += delta
+    rows = {key: counts for key, counts in rows.items() if any(counts.values())}
+    if not rows:
+        return
+
+    with transaction.atomic(using=using):
+        ProductFacetCount.objects.using(using).bulk_create([
+            ProductFacetCount(category_id=category_id, price_bucket=bucket)
+            for (category_id, bucket), counts in rows.items() if max(counts.values()) > 0
+        ], ignore_conflicts=True)
+        for (category_id, bucket), counts in sorted(rows.items()):
+            ProductFacetCount.objects.using(using).filter(category_id=category_id, price_bucket=bucket).update(
+                **{field: F(field) + delta for field, delta in counts.items() if delta})
+
+
+def product_pre_save_handler(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    # Remember where the product was counted before this save, so post_save can move it.
+    instance._facet_key = None
+    if instance.pk is None or (update_fields is not None and not FACET_FIELDS.intersection(update_fields)):
+        return
+    before = Product.objects.using(using).filter(pk=instance.pk).values_list(
+        'category_id', 'price', 'quantity').first()
+    instance._facet_key = facet_key(*before) if before else None
+
+
+def product_saved_handler(sender, instance, created=False, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None,
+                          **kwargs):
+    if update_fields is not None and not FACET_FIELDS.intersection(update_fields):
+        return
+    deltas = Counter({facet_key(instance.category_id, instance.price, instance.quantity): 1})
+    before = getattr(instance, '_facet_key', None)
+    if before is not None:
+        deltas[before] -= 1
+    apply_deltas(deltas, using)
+
+
+def product_deleted_handler(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    apply_deltas({facet_key(instance.category_id, instance.price, instance.quantity): -1}, using)
+
+
+def stock_changed(sold_out=None, restocked=None):
+    """
+    Move products whose quantity crossed zero in a bulk UPDATE (which sends no
+    signals) between the in-stock and out-of-stock counts. Both arguments are
+    Product querysets matching exactly those products.
+    """
+    deltas = Counter()
+    for products, delta in ((sold_out, -1), (restocked, 1)):
+        if products is None:
+            continue
+        for category_id, price in products.values_list('category_id', 'price'):
+            bucket = price_bucket(price)
+            deltas[category_id, bucket, True] += delta
+            deltas[category_id, bucket, False] -= delta
+    apply_deltas(deltas)
+
+
+def bucket_expression(buckets, price=F('price')):
+    return Case(
+        *[When(LessThan(price, upper), then=Value(i)) for i, upper in enumerate(buckets[1:])],
+        default=Value(len(buckets) - 1), output_field=IntegerField(),
+    )
+
+
+def repricing_deltas(products, price):
+    """
+    The counter deltas for setting the price of `products` to the expression
+    `price` in a bulk UPDATE, computed with one GROUP BY over the old and new
+    buckets. Run it in the UPDATE's transaction, before the UPDATE.
+    """
+    buckets = get_price_buckets()
+    rows = products.annotate(
+        old_bucket=bucket_expression(buckets), new_bucket=bucket_expression(buckets, price),
+    ).values('category_id', 'old_bucket', 'new_bucket').annotate(
+        total=Count('id'), in_stock=Count('id', filter=Q(quantity__gt=0)),
+    ).order_by()
+    deltas = Counter()
+    for row in rows:
+        if row['old_bucket'] == row['new_bucket']:
+            continue
+        for bucket, sign in ((row['old_bucket'], -1), (row['new_bucket'], 1)):
+            deltas[row['category_id'], bucket, True] += sign * row['in_stock']
+            deltas[row['category_id'], bucket, False] += sign * (row['total'] - row['in_stock'])
+    return deltas
+
+
+def count_rows(product_model, count_model, buckets, using=DEFAULT_DB_ALIAS):
+    rows = product_model._default_manager.using(using).annotate(
+        bucket=bucket_expression(buckets),
+    ).values('category_id', 'bucket').annotate(
+        total=Count('id'), in_stock=Count('id', filter=Q(quantity__gt=0)),
+    ).order_by()
+    return [
+        count_model(category_id=row['category_id'], price_bucket=row['bucket'],
+                    product_count=row['total'], in_stock_count=row['in_stock'])
+        for row in rows
+    ]
+
+
+def rebuild_facet_counts(using=DEFAULT_DB_ALIAS):
+    """Recompute the whole counter table with one GROUP BY (after bulk writes or a bucket change)."""
+    rows = count_rows(Product, ProductFacetCount, get_price_buckets(), using)
+    with transaction.atomic(using=using):
+        ProductFacetCount.objects.using(using).all().delete()
+        ProductFacetCount.objects.using(using).bulk_create(rows)
+    return len(rows)
+
+
+def get_facets(category_ids=None, in_stock=False):
+    """
+    Per-category product counts and a price histogram, read from the counter table.
+
+    Category counts ignore `category_ids` (so a client can offer the other
+    categories as alternatives); the histogram is restricted to them.
+    """
+    count_field = 'in_stock_count' if in_stock else 'product_count'
+    by_category, by_bucket = Counter(), Counter()
+    for category_id, bucket, count in ProductFacetCount.objects.values_list('category_id', 'price_bucket', count_field):
+        by_category[category_id] += count
+        if not category_ids or category_id in category_ids:
+            by_bucket[bucket] += count
+
+    buckets = get_price_buckets()
+    return {
+        'total': sum(by_bucket.values()),
+        'categories': [
+            {'id': category_id, 'name': name, 'count': by_category[category_id]}
+            for category_id, name in Category.objects.order_by('name', 'id').values_list('id', 'name')
+        ],
+        'price': [
+            {'min': lower, 'max': buckets[i + 1] if i + 1 < len(buckets) else None, 'count': by_bucket[i]}
+            for i, lower in enumerate(buckets)
+        ],
+    }
@@ -0,0 +1,27 @@
+from django_filters import rest_framework as filters
+
+from ..models import Product
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    `?category=1,2&min_price=10&max_price=50&in_stock=true`.
+
+    Only plain number/boolean filters are used: they validate without
+    database lookups, so the same filterset works in the async read views.
+    """
+    category = NumberInFilter(field_name='category_id')
+    min_price = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
+
+    class Meta:
+        model = Product
+        fields = ('category', 'min_price', 'max_price', 'in_stock')
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(quantity__gt=0) if value else queryset.filter(quantity=0)
@@ -0,0 +1,276 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ..instrumentation.middleware import phase
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a stable composite key, e.g. (price, id).
+
+    Each page is a `WHERE key > last_key ORDER BY key LIMIT n` query, so page
+    5000 costs the same as page 1 and no COUNT(*) is run.
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+    default_ordering = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request).aiterator()])
+
+    def page_queryset(self, queryset, request):
+        """Return the (unevaluated) query for the requested page, plus one extra row."""
+        self.request = request
+        self.limit = self.get_limit(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            self.ordering = self.get_ordering(request)
+            self.key, self.reverse = None, False
+        else:
+            self.ordering, key, self.reverse = cursor
+            self.key = self.clean_key(queryset.model, self.orderings[self.ordering], key)
+
+        fields = self.orderings[self.ordering]
+        if self.reverse:
+            fields = tuple(self.flip(field) for field in fields)
+
+        if self.key is not None:
+            queryset = queryset.filter(self.after(fields, self.key))
+        return queryset.order_by(*fields)[:self.limit + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.key is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering not in self.orderings:
+            return self.default_ordering
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(self.page[0], reverse=True)
+
+    def build_link(self, row, reverse):
+        fields = self.orderings[self.ordering]
+        key = [getattr(row, field.lstrip('-')) for field in fields]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.ordering_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.ordering, key, reverse))
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def after(fields, key):
+        """Lexicographic `fields > key`, honouring the direction of each field."""
+        condition = Q()
+        for i, field in enumerate(fields):
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            clause = Q(**{field.lstrip('-') + lookup: key[i]})
+            for previous, value in zip(fields[:i], key):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def clean_key(self, model, fields, key):
+        """The cursor's key values as their fields' types; anything a field rejects makes the cursor invalid."""
+        cleaned = []
+        for field, value in zip(fields, key):
+            try:
+                if value is None:
+                    raise ValidationError('Cursor keys cannot be null.')
+                cleaned.append(model._meta.get_field(field.lstrip('-')).clean(value, None))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, ordering, key, reverse):
+        # Decimal prices go in as strings, which the price lookups accept as they are.
+        payload = json.dumps({'o': ordering, 'k': key, 'r': int(reverse)}, separators=(',', ':'), default=str)
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            ordering, key, reverse = payload['o'], payload['k'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering not in self.orderings or not isinstance(key, list) or len(key) != len(self.orderings[ordering]):
+            raise NotFound(self.invalid_cursor_message)
+        return ordering, key, reverse
+
+
+class AsyncLimitOffsetPagination(LimitOffsetPagination):
+    """LimitOffsetPagination with an async variant for the ASGI read views."""
+
+    def get_count(self, queryset):
+        with phase('count'):
+            return super().get_count(queryset)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        with phase('count'):
+            self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit].aiterator()]
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+
+class ProductPagination(AsyncLimitOffsetPagination):
+    """
+    The default limit/offset pagination, plus two opt-ins for large catalogs:
+
+    * `?pagination=keyset` (or any `?cursor=`) switches to KeysetPagination.
+    * `?count=false` skips the COUNT(*) query; `count` is then returned as null.
+    """
+    keyset_class = KeysetPagination
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        if self.include_count(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        page = self.uncounted_page_queryset(queryset, request)
+        return None if page is None else self.set_uncounted_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        if self.include_count(request):
+            return await super().apaginate_queryset(queryset, request, view)
+
+        page = self.uncounted_page_queryset(queryset, request)
+        return None if page is None else self.set_uncounted_page([row async for row in page.aiterator()])
+
+    def uncounted_page_queryset(self, queryset, request):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.count = None
+        return queryset[self.offset:self.offset + self.limit + 1]
+
+    def set_uncounted_page(self, results):
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_paginated_data(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_data(data)
+        return super().get_paginated_data(data)
+
+    def get_next_link(self):
+        if self.count is None:
+            if not self.has_next:
+                return None
+            url = self.request.build_absolute_uri()
+            url = replace_query_param(url, self.limit_query_param, self.limit)
+            return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+        return super().get_next_link()
+
+    def use_keyset(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'keyset'
+                or self.keyset_class.cursor_query_param in request.query_params)
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('0', 'false', 'no')
@@ -0,0 +1,56 @@
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Anything the fast encoders do not know natively (Decimal prices, lazy
+# strings, ...) is converted the way DRF's JSONEncoder does, so every format
+# carries the same values as the plain JSON response.
+encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same compact UTF-8 output with orjson, several
+    times faster on large pages. Pretty-printing (`; indent=`, the browsable
+    API) and installs without orjson go through the standard encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Datetimes are passed through so they get DRF's formatting too.
+        return orjson.dumps(data, default=encode_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack for internal consumers: `Accept: application/msgpack` or `?format=msgpack`."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+def data_renderer_classes():
+    """The catalog's renderers for data; MessagePack only when the msgpack package is installed."""
+    return [ORJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+
+
+CATALOG_RENDERER_CLASSES = data_renderer_classes() + [BrowsableAPIRenderer]
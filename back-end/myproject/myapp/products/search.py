@@ -0,0 +1,132 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from ..models import Product
+
+
+PRODUCT_TABLE = Product._meta.db_table
+FTS_TABLE = PRODUCT_TABLE + '_fts'
+POSTGRES_INDEX = PRODUCT_TABLE + '_search_idx'
+POSTGRES_DOCUMENT = "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='{PRODUCT_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# bm25() column weights: a hit in the name counts ten times a hit in the description.
+SQLITE_RANK_WEIGHTS = '10.0, 1.0'
+
+
+def search_supported(connection):
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def index_installed(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [FTS_TABLE + '_a_'],
+            )
+            return cursor.fetchone()[0] == 3
+        cursor.execute('SELECT count(*) FROM pg_indexes WHERE indexname = %s', [POSTGRES_INDEX])
+        return cursor.fetchone()[0] == 1
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Create the full-text index and its sync triggers if they are missing.
+
+    SQLite drops triggers whenever a migration remakes the product table, so
+    this runs after every `migrate` and rebuilds the index when it had to
+    reinstall anything.
+    """
+    connection = connections[using]
+    if not search_supported(connection) or PRODUCT_TABLE not in connection.introspection.table_names():
+        return False
+    if index_installed(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for statement in SQLITE_SCHEMA:
+                cursor.execute(statement)
+        else:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON {PRODUCT_TABLE} USING GIN ({POSTGRES_DOCUMENT})')
+    rebuild_search_index(using)
+    return True
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'REINDEX INDEX {POSTGRES_INDEX}')
+
+
+def install_search_index_handler(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    install_search_index(using)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on products.
+
+    Matches every search term as a prefix against name and description using
+    SQLite FTS5 or a PostgreSQL tsvector index, and orders results by
+    relevance. Other databases fall back to SearchFilter's icontains lookups.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = [word for term in self.get_search_terms(request) for word in re.findall(r'\w+', term)]
+        if not terms or not search_supported(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+        return full_text_search(queryset, terms)
+
+
+def full_text_search(queryset, terms):
+    """Products matching every one of `terms` as a prefix, most relevant first; needs search_supported()."""
+    if connections[queryset.db].vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in terms)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match],
+        )).annotate(search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {SQLITE_RANK_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {PRODUCT_TABLE}.id', [match], output_field=FloatField(),
+        )).order_by('search_rank', 'id')
+
+    query = ' & '.join(f'{word}:*' for word in terms)
+    return queryset.filter(RawSQL(
+        f"{POSTGRES_DOCUMENT} @@ to_tsquery('english', %s)", [query], output_field=BooleanField(),
+    )).annotate(search_rank=RawSQL(
+        f"ts_rank({POSTGRES_DOCUMENT}, to_tsquery('english', %s))", [query], output_field=FloatField(),
+    )).order_by('-search_rank', 'id')
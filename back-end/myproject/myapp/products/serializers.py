@@ -1,21 +1,100 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from rest_framework import serializers
+from ..images.services import (
+    InvalidImage, get_image_options, image_url, inline_to_ref, load_images, parse_ref, product_refs,
+)
 from ..models import Product, Category
 
 
 
 
+class PriceField(serializers.DecimalField):
+    """
+    A price, rounded half up to whole cents. Prices used to be floats, which
+    took any number of decimal places, so extra places are rounded, not rejected.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(max_digits=12, decimal_places=2, rounding=ROUND_HALF_UP, **kwargs)
+
+    def validate_precision(self, value):
+        # Values too large to quantize are left for the max_digits check.
+        if value.adjusted() < self.max_digits - self.decimal_places:
+            value = value.quantize(Decimal(1).scaleb(-self.decimal_places), rounding=self.rounding)
+        return super().validate_precision(value)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Resolve the image references of the whole page with one query.
+        products = list(data.all() if hasattr(data, 'all') else data)
+        images = self.context.get('images')
+        self.child.images = images if images is not None else load_images(product_refs(products))
+        try:
+            return super().to_representation(products)
+        finally:
+            self.child.images = None
+
+
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
+    price = PriceField()
 
     #So we used PrimaryKeyRelatedField in order to create product and connect it to category with its id
     class Meta:
         model = Product
         fields = '__all__'
+        list_serializer_class = ProductListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.images = None
+        # Sparse fieldsets (?fields=) and ?expand=category, passed in by ProductViewSet for reads
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        self.include_placeholder = not fields or 'thumbnail_placeholder' in fields
+        if 'category' in self.context.get('expand', ()) and 'category' in self.fields:
+            self.fields['category'] = CategorySerializer(read_only=True)
+
+    def to_representation(self, instance):
+        # thumbnail/additional_images hold "sha256:..." image references or plain URLs; clients get
+        # variant URLs and never inline data URIs.
+        data = super().to_representation(instance)
+        if 'thumbnail' not in data and 'additional_images' not in data and not self.include_placeholder:
+            return data
+        images = self.images if self.images is not None else self.context.get('images')
+        if images is None:
+            images = load_images(product_refs([instance]))
+        options = get_image_options()
+        if 'thumbnail' in data:
+            data['thumbnail'] = image_url(instance.thumbnail, images, options['THUMBNAIL_VARIANT'])
+        if self.include_placeholder:
+            image = images.get(parse_ref(instance.thumbnail))
+            data['thumbnail_placeholder'] = (image.blurhash or None) if image is not None else None
+        if 'additional_images' in data and isinstance(instance.additional_images, list):
+            urls = (image_url(value, images, options['GALLERY_VARIANT']) for value in instance.additional_images)
+            data['additional_images'] = [url for url in urls if url]
+        return data
 
+    def validate_thumbnail(self, value):
+        try:
+            return inline_to_ref(value)
+        except InvalidImage as exc:
+            raise serializers.ValidationError(str(exc))
 
+    def validate_additional_images(self, value):
+        if not isinstance(value, list):
+            return value
+        try:
+            return [inline_to_ref(item) for item in value]
+        except InvalidImage as exc:
+            raise serializers.ValidationError(str(exc))
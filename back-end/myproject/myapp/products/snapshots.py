@@ -0,0 +1,483 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.settings import api_settings
+
+from ..models import Category, Product
+from ..tasks.services import enqueue
+from .cache import get_catalog_cache, get_category_versions
+from .pagination import KeysetPagination
+from .renderers import ORJSONRenderer
+from .serializers import ProductSerializer
+
+
+# Precomputed /products/ pages. For the unfiltered listing ('all') and each
+# category, every page of every KeysetPagination ordering is rendered once
+# and written as an immutable file named by its content hash; a small JSON
+# manifest per listing lists the pages and the category versions it was built
+# from (see get_category_versions). A list request without search or other
+# filters is answered from the page file, memory-mapped, wrapped in the
+# pagination envelope; a stale or missing manifest sends it to the live query.
+#
+# Writes bump the versions of the categories they touch, and the next build
+# only redoes those listings plus 'all' (from the unchanged categories' saved
+# items and the changed categories' fresh rows).
+
+logger = logging.getLogger(__name__)
+
+ALL = 'all'
+# Parameters that narrow or reshape the listing: requests with any of them are served live.
+LIVE_PARAMS = ('search', 'fields', 'expand', 'min_price', 'max_price', 'in_stock')
+
+
+def get_options():
+    return {
+        'ENABLED': False,
+        'ROOT': os.path.join(settings.BASE_DIR, 'catalog-snapshots'),
+        'PAGE_SIZE': api_settings.PAGE_SIZE,
+        'REBUILD': True,
+        'REBUILD_DELAY': 1.0,
+        'MAPPED_PAGES': 1000,
+        'PRUNE_AFTER': 3600,
+        **getattr(settings, 'CATALOG_SNAPSHOTS', {}),
+    }
+
+
+def render(data):
+    return ORJSONRenderer().render(data)
+
+
+def sort_key(ordering):
+    """Python sort key over (id, price) rows matching KeysetPagination.orderings[ordering]."""
+    fields = KeysetPagination.orderings[ordering]
+    positions = {'id': 0, 'price': 1}
+
+    def key(row):
+        return tuple(-row[positions[field[1:]]] if field.startswith('-') else row[positions[field]] for field in fields)
+    return key
+
+
+def cursor_key(ordering, row):
+    # Prices as strings, as KeysetPagination.encode_cursor writes them.
+    values = {'id': row[0], 'price': str(row[1])}
+    return [values[field.lstrip('-')] for field in KeysetPagination.orderings[ordering]]
+
+
+class SnapshotStore:
+    """The files under ROOT: pages/<sha256>.json, items/<sha256>.jsonl and manifests/<listing>.json."""
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def write_blob(self, kind, data, extension):
+        """Store immutable content under its hash; returns the hash. Existing content is not rewritten."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(kind, f'{digest}.{extension}')
+        if not os.path.exists(path):
+            self.write_atomic(path, data)
+        return digest
+
+    def page_path(self, digest):
+        return self.path('pages', f'{digest}.json')
+
+    def read_items(self, digest):
+        with open(self.path('items', f'{digest}.jsonl'), 'rb') as file:
+            return file.read().split(b'\n')
+
+    def manifest_path(self, listing):
+        return self.path('manifests', f'{listing}.json')
+
+    def read_manifest(self, listing):
+        try:
+            with open(self.manifest_path(listing), 'rb') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, listing, manifest):
+        self.write_atomic(self.manifest_path(listing), json.dumps(manifest, separators=(',', ':')).encode())
+
+    def listings(self):
+        try:
+            return [name[:-5] for name in os.listdir(self.path('manifests')) if name.endswith('.json')]
+        except FileNotFoundError:
+            return []
+
+    def remove_manifest(self, listing):
+        try:
+            os.remove(self.manifest_path(listing))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, older_than):
+        """Delete page and item files no manifest refers to and not modified for `older_than` seconds."""
+        referenced = set()
+        for listing in self.listings():
+            manifest = self.read_manifest(listing) or {}
+            referenced.add(manifest.get('items'))
+            for pages in manifest.get('orderings', {}).values():
+                referenced.update(page['file'] for page in pages)
+        removed = 0
+        cutoff = time.time() - older_than
+        for kind in ('pages', 'items'):
+            try:
+                names = os.listdir(self.path(kind))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                path = self.path(kind, name)
+                if name.split('.')[0] not in referenced and os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def serialize_items(products, batch_size=1000):
+    """{category id: {id: (price, rendered item)}} for `products`; images are loaded once per batch."""
+    items = {}
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) == batch_size:
+            render_batch(batch, items)
+            batch = []
+    render_batch(batch, items)
+    return items
+
+
+def render_batch(products, items):
+    data = ProductSerializer(products, many=True, context={}).data
+    for product, item in zip(products, data):
+        items.setdefault(product.category_id, {})[product.id] = (product.price, render(item))
+
+
+def write_listing(store, listing, stamp, rows, items, page_size, extra=None):
+    """
+    Write the pages of one listing in every ordering, then its manifest.
+
+    `rows` are (id, price) pairs and `items` the rendered item of each id; a
+    page is `[item,item,...]`, byte for byte what the JSON renderer makes of
+    the serialized page.
+    """
+    orderings = {}
+    for ordering in KeysetPagination.orderings:
+        ordered = sorted(rows, key=sort_key(ordering))
+        pages = []
+        for start in range(0, max(len(ordered), 1), page_size):
+            chunk = ordered[start:start + page_size]
+            body = b'[' + b','.join(items[id] for id, _ in chunk) + b']'
+            pages.append({
+                'file': store.write_blob('pages', body, 'json'),
+                'first': cursor_key(ordering, chunk[0]) if chunk else None,
+                'last': cursor_key(ordering, chunk[-1]) if chunk else None,
+            })
+        orderings[ordering] = pages
+    store.write_manifest(listing, {
+        'stamp': stamp, 'built': time.time(), 'count': len(rows), 'page_size': page_size, 'orderings': orderings,
+        **(extra or {}),
+    })
+
+
+def build_snapshot(full=False, stdout=None):
+    """
+    Rebuild the listings whose category version moved since they were built
+    (all of them with `full`); returns the names of the listings written.
+    """
+    options = get_options()
+    store = SnapshotStore(options['ROOT'])
+    page_size = options['PAGE_SIZE']
+
+    # Versions are read before any row, so a write racing the build leaves its listing stale, not wrong.
+    [all_stamp] = get_category_versions([ALL])
+    category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+    stamps = dict(zip(category_ids, get_category_versions(category_ids)))
+    manifests = {id: store.read_manifest(str(id)) for id in category_ids}
+
+    def current(manifest, stamp):
+        return not full and manifest is not None and manifest['stamp'] == stamp and manifest['page_size'] == page_size
+
+    stale = [id for id in category_ids if not current(manifests[id], stamps[id])]
+    rebuild_all = bool(stale) or not current(store.read_manifest(ALL), all_stamp)
+    built = []
+
+    items = serialize_items(Product.objects.filter(category_id__in=stale).order_by('id')) if stale else {}
+    for category_id in stale:
+        category_items = items.get(category_id, {})
+        rows = [(id, price) for id, (price, _) in category_items.items()]
+        rendered = {id: item for id, (_, item) in category_items.items()}
+        write_listing(store, str(category_id), stamps[category_id], rows, rendered, page_size, {
+            'items': store.write_blob('items', b'\n'.join(rendered.values()), 'jsonl'),
+            'rows': [[id, str(price)] for id, price in rows],
+        })
+        built.append(str(category_id))
+        if stdout:
+            stdout.write(f'\rbuilt {len(built)}/{len(stale)} categories', ending='')
+
+    if rebuild_all:
+        # Unchanged categories contribute the items saved with their listing, so only changed rows are serialized.
+        rows, rendered = [], {}
+        for category_id in category_ids:
+            if category_id in stale:
+                category_items = items.get(category_id, {})
+                rows += [(id, price) for id, (price, _) in category_items.items()]
+                rendered.update((id, item) for id, (_, item) in category_items.items())
+            elif manifests[category_id]['rows']:
+                manifest = manifests[category_id]
+                ids = [id for id, _ in manifest['rows']]
+                rows += [(id, Decimal(price)) for id, price in manifest['rows']]
+                rendered.update(zip(ids, store.read_items(manifest['items'])))
+        write_listing(store, ALL, all_stamp, rows, rendered, page_size)
+        built.append(ALL)
+
+    for listing in set(store.listings()) - {ALL, *map(str, category_ids)}:
+        store.remove_manifest(listing)
+    if stdout and stale:
+        stdout.write('')
+    return built
+
+
+class MappedPages:
+    """
+    Page files memory-mapped on first use and kept open in an LRU of up to
+    MAPPED_PAGES entries; the files never change. Evicted maps are not closed
+    here, since a request may still be reading one: each closes once nothing
+    refers to it any more.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            page = self.entries.get(path)
+            if page is not None:
+                self.entries.move_to_end(path)
+                return page
+        with open(path, 'rb') as file:
+            page = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        max_entries = self.max_entries or get_options()['MAPPED_PAGES']
+        with self.lock:
+            self.entries[path] = page
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ManifestCache:
+    """Parsed manifests, re-read when the file is replaced."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, store, listing):
+        path = store.manifest_path(listing)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != signature:
+            manifest = store.read_manifest(listing)
+            if manifest is None:
+                return None
+            entry = self.entries[path] = (signature, manifest)
+        return entry[1]
+
+
+mapped_pages = MappedPages()
+manifest_cache = ManifestCache()
+
+
+def find_page(view, request, manifest):
+    """(page index, ordering, paginator ready to build the envelope) for the request, or None."""
+    pages_by_ordering = manifest['orderings']
+    page_size = manifest['page_size']
+    paginator = view.paginator
+    if paginator.use_keyset(request):
+        keyset = paginator.keyset = paginator.keyset_class()
+        try:
+            cursor = keyset.decode_cursor(request)
+        except NotFound:
+            return None
+        keyset.request, keyset.limit = request, keyset.get_limit(request)
+        keyset.ordering = cursor[0] if cursor else keyset.get_ordering(request)
+        pages = pages_by_ordering[keyset.ordering]
+        if keyset.limit != page_size:
+            return None
+        if cursor is None:
+            index = 0
+        else:
+            _, key, reverse = cursor
+            boundary = 'first' if reverse else 'last'
+            matches = [i for i, page in enumerate(pages) if page[boundary] == key]
+            if not matches:
+                return None
+            index = matches[0] - 1 if reverse else matches[0] + 1
+            if not 0 <= index < len(pages):
+                return None
+        fields = keyset.orderings[keyset.ordering]
+        page = pages[index]
+        keyset.page = [SimpleNamespace(**{field.lstrip('-'): value for field, value in zip(fields, page[end])})
+                       for end in ('first', 'last')] if page['first'] is not None else []
+        keyset.has_next = index + 1 < len(pages)
+        keyset.has_previous = index > 0
+        return page
+
+    paginator.keyset = None
+    if not paginator.include_count(request):
+        return None
+    paginator.request, paginator.count = request, manifest['count']
+    paginator.limit, paginator.offset = paginator.get_limit(request), paginator.get_offset(request)
+    pages = pages_by_ordering[KeysetPagination.default_ordering]
+    if paginator.limit != page_size or paginator.offset % page_size or paginator.offset // page_size >= len(pages):
+        return None
+    return pages[paginator.offset // page_size]
+
+
+def snapshot_response(view, request):
+    """
+    The `ProductViewSet.list` response for `request` from the snapshot, or
+    None if it has to be served live: snapshots off, search or other filters,
+    sparse fields, an unusual page size, or a listing that is stale or not built.
+    """
+    options = get_options()
+    if not options['ENABLED']:
+        return None
+    params = request.query_params
+    categories = params.getlist('category')
+    if any(params.get(name) for name in LIVE_PARAMS) or len(categories) > 1 \
+            or (categories and not categories[0].isdigit()):
+        return None
+    media_type = getattr(request, 'accepted_media_type', None) or view.select_data_renderer(request)[1]
+    if media_type != ORJSONRenderer.media_type:
+        return None
+
+    listing = str(int(categories[0])) if categories else ALL
+    store = SnapshotStore(options['ROOT'])
+    manifest = manifest_cache.get(store, listing)
+    [stamp] = get_category_versions([listing])
+    if manifest is None or manifest['stamp'] != stamp:
+        # Queued rebuilds follow the writes (and the periodic build) instead of the reads.
+        if options['REBUILD'] and options['REBUILD'] != 'queue':
+            rebuilder.schedule()
+        return None
+    page = find_page(view, request, manifest)
+    if page is None:
+        return None
+
+    head = render(view.paginator.get_paginated_data([]))
+    etag = f'W/"{hashlib.md5(head + page["file"].encode()).hexdigest()}"'
+    last_modified = math.ceil(manifest['built'])
+    response = view.get_not_modified(request, etag)
+    if response is None:
+        # The envelope ends in `"results":[]}`; the page goes in its place.
+        body = head[:-3] + mapped_pages.get(store.page_path(page['file']))[:] + b'}'
+        response = HttpResponse(body, content_type=ORJSONRenderer.media_type)
+    return view.set_validators(response, etag, last_modified)
+
+
+BUILD_LOCK_KEY = 'catalog:snapshot:building'
+REBUILD_TASK = 'catalog.build_snapshot'
+
+
+def build_exclusively():
+    """
+    Build unless another process is building (a lock in the catalog cache);
+    returns whether it built. Page files the build left unused are pruned
+    once they are PRUNE_AFTER seconds old.
+    """
+    cache = get_catalog_cache()
+    if not cache.add(BUILD_LOCK_KEY, os.getpid(), timeout=600):
+        return False
+    try:
+        build_snapshot()
+        options = get_options()
+        SnapshotStore(options['ROOT']).prune(options['PRUNE_AFTER'])
+    finally:
+        cache.delete(BUILD_LOCK_KEY)
+    return True
+
+
+class Rebuilder:
+    """
+    Rebuilds stale listings in a background thread of this process. Requests
+    made while a build runs are coalesced into one more build after it; a
+    cache lock keeps other processes from building at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = False
+        self.thread = None
+
+    def schedule(self):
+        with self.lock:
+            self.pending = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='catalog-snapshots', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        try:
+            while True:
+                time.sleep(get_options()['REBUILD_DELAY'])
+                with self.lock:
+                    if not self.pending:
+                        self.thread = None
+                        return
+                    self.pending = False
+                self.build()
+        finally:
+            connections.close_all()
+
+    def build(self):
+        try:
+            if not build_exclusively():
+                # Another process is building; check again after it.
+                self.schedule()
+        except Exception:
+            logger.exception('Rebuilding the catalog snapshot failed')
+
+
+rebuilder = Rebuilder()
+
+
+def rebuild_handler(sender, **kwargs):
+    # REBUILD = 'queue' hands the build to the `run_tasks` workers; any other true value uses the thread.
+    options = get_options()
+    if not (options['ENABLED'] and options['REBUILD']):
+        return
+    if options['REBUILD'] == 'queue':
+        enqueue(REBUILD_TASK, key=REBUILD_TASK, countdown=options['REBUILD_DELAY'])
+    else:
+        transaction.on_commit(rebuilder.schedule)
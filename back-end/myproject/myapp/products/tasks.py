@@ -0,0 +1,10 @@
+from ..tasks.services import enqueue, task
+from .snapshots import REBUILD_TASK, build_exclusively, get_options
+
+
+@task(REBUILD_TASK)
+def build_catalog_snapshot():
+    options = get_options()
+    if options['ENABLED'] and not build_exclusively():
+        # Another process is building; build again once it is done.
+        enqueue(REBUILD_TASK, key=REBUILD_TASK, countdown=options['REBUILD_DELAY'])
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from .views import *
@@ -10,4 +11,14 @@ router.register('products', ProductViewSet)
 urlpatterns = [
     path('categories/',CategoriesView.as_view(), name="category"),
     *router.urls,
-]
\ No newline at end of file
+]
+
+if settings.ASYNC_CATALOG_VIEWS:
+    from .async_views import AsyncCategoriesView, AsyncProductDetailView, AsyncProductListView
+
+    urlpatterns = [
+        path('categories/', AsyncCategoriesView.as_view(), name="category"),
+        path('products/', AsyncProductListView.as_view(), name='product-list'),
+        path('products/<int:pk>/', AsyncProductDetailView.as_view(), name='product-detail'),
+        *urlpatterns[1:],
+    ]
\ No newline at end of file
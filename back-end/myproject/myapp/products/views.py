@@ -1,23 +1,165 @@
+import codecs
+
+from django.http import StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
 from .serializers import  ProductSerializer, CategorySerializer
-from rest_framework import status, generics, viewsets, filters
+from rest_framework import status, generics, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from ..models import Product, Category
 from rest_framework.permissions import IsAdminUser
+from .pagination import AsyncLimitOffsetPagination, ProductPagination
+from .search import FullTextSearchFilter
+from .facets import get_facets
+from .filters import ProductFilter
+from .cache import CachedResponseMixin
+from .renderers import CATALOG_RENDERER_CLASSES
+from .snapshots import snapshot_response
+from ..instrumentation.mixins import InstrumentedViewMixin
+from ..routers import ReplicaReadsMixin
+from .bulk import CONTENT_TYPES, FORMATS, ProductImporter, content_type_format, export_lines, read_rows
 
 
 
 
-class CategoriesView(generics.ListAPIView):
+class CategoriesView(InstrumentedViewMixin, ReplicaReadsMixin, CachedResponseMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = AsyncLimitOffsetPagination
+    renderer_classes = CATALOG_RENDERER_CLASSES
+    cache_models = (Category,)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(InstrumentedViewMixin, ReplicaReadsMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter]
+    pagination_class = ProductPagination
+    renderer_classes = CATALOG_RENDERER_CLASSES
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_class = ProductFilter
     search_fields = ['name']
+    cache_query_params = CachedResponseMixin.cache_query_params + (
+        'category', 'min_price', 'max_price', 'in_stock',
+    )
+    replica_actions = ReplicaReadsMixin.replica_actions + ('batch',)
+    # Most ids one ?ids= request may ask for.
+    batch_max_ids = 100
+    # Rows written per transaction by the import action.
+    import_batch_size = 1000
+
+    expandable_fields = ('category',)
+    # Response-only fields allowed in ?fields=, and the model field each one is computed from.
+    computed_fields = {'thumbnail_placeholder': 'thumbnail'}
+
+    def list(self, request, *args, **kwargs):
+        response = snapshot_response(self, request)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return response
 
     def get_permissions(self):
-        if self.action not in ['list', 'retrieve']:
+        if self.action not in ['list', 'retrieve', 'facets', 'batch']:
             return [IsAdminUser()]
         return super().get_permissions()
+
+    def get_list_param(self, name):
+        value = self.request.query_params.get(name, '')
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_sparse_fields(self):
+        if self.action not in ['list', 'retrieve', 'batch']:
+            return []
+        model_fields = [field.name for field in Product._meta.concrete_fields] + list(self.computed_fields)
+        return [name for name in self.get_list_param('fields') if name in model_fields]
+
+    def get_expand(self):
+        if self.action not in ['list', 'retrieve', 'batch']:
+            return []
+        return [name for name in self.get_list_param('expand') if name in self.expandable_fields]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_sparse_fields()
+        expand = self.get_expand()
+        if 'category' in expand and (not fields or 'category' in fields):
+            queryset = queryset.select_related('category')
+            if fields:
+                fields = fields + ['category__name']
+        if fields:
+            queryset = queryset.only(*{self.computed_fields.get(name, name) for name in fields})
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        context['expand'] = self.get_expand()
+        return context
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Per-category counts and price buckets, optionally for `?category=1,2` and `?in_stock=true`."""
+        return self.cached_response(self.get_facets, request)
+
+    def get_facets(self, request):
+        filterset = ProductFilter(request.query_params, queryset=Product.objects.none())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = filterset.form.cleaned_data
+        return Response(get_facets(category_ids=set(data.get('category') or ()), in_stock=bool(data.get('in_stock'))))
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Products for `?ids=3,1,2` in that order, plus the ids that do not exist.
+
+        Takes ?fields= and ?expand= like retrieve and shares its cache entries:
+        cached products cost no query and the rest are loaded with one.
+        """
+        values = list(dict.fromkeys(self.get_list_param('ids')))
+        if not values or not all(value.isdigit() for value in values):
+            return Response({'detail': 'ids must be a comma-separated list of product ids.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(values) > self.batch_max_ids:
+            return Response({'detail': f'At most {self.batch_max_ids} ids per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ids = [int(value) for value in values]
+
+        def load(missing):
+            products = list(self.filter_queryset(self.get_queryset()).filter(id__in=missing))
+            return zip((product.id for product in products), self.get_serializer(products, many=True).data)
+
+        found = self.cached_retrieve_many(request, ids, load)
+        return Response({
+            'results': [found[id] for id in ids if id in found],
+            'missing': [id for id in ids if id not in found],
+        })
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """Stream a CSV (text/csv) or JSON Lines (application/x-ndjson) body of products into the catalog."""
+        format = content_type_format(request.content_type)
+        if format is None:
+            return Response({'detail': f'Content-Type must be one of: {", ".join(CONTENT_TYPES.values())}.'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        importer = ProductImporter(batch_size=self.import_batch_size,
+                                   create_categories=request.query_params.get('create_categories') == 'true')
+        lines = codecs.iterdecode(request._request, 'utf-8')
+        try:
+            result = importer.run(read_rows(lines, format))
+        except UnicodeDecodeError:
+            # Batches read before the bad bytes are already committed; say how many.
+            return Response({'detail': 'Body must be UTF-8 encoded.', **importer.result()},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_products(self, request):
+        format = request.query_params.get('file_format', 'csv')
+        if format not in FORMATS:
+            return Response({'detail': f'file_format must be one of: {", ".join(FORMATS)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_lines(format), content_type=CONTENT_TYPES[format])
+        response['Content-Disposition'] = f'attachment; filename="products.{format}"'
+        return response
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .services import GROUPINGS
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False, help_text='First day, inclusive. Defaults to 30 days ago.')
+    until = serializers.DateField(required=False, help_text='Last day, inclusive. Defaults to today.')
+    group_by = serializers.ChoiceField(choices=GROUPINGS, default='day')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate(self, attrs):
+        until = attrs.setdefault('until', timezone.localdate())
+        since = attrs.setdefault('since', until - timedelta(days=29))
+        if since > until:
+            raise serializers.ValidationError('since must not be after until.')
+        return attrs
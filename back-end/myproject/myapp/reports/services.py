@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from ..models import Order, OrderItem, Product
+
+
+# Money is summed in the database as DECIMAL, so totals are exact (on SQLite,
+# which has no decimal type, as exact as its REAL arithmetic).
+MONEY = DecimalField(max_digits=16, decimal_places=2)
+GROUPINGS = ('day', 'product', 'category')
+
+
+def money_sum(expression):
+    return Coalesce(Sum(expression, output_field=MONEY), 0, output_field=MONEY)
+
+
+def sold_items(since, until):
+    """Items of placed orders created on the dates since..until (inclusive), in the current time zone."""
+    start = timezone.make_aware(datetime.combine(since, time.min))
+    end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+    return OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end, order__status=Order.Status.PLACED,
+    )
+
+
+def sales_figures():
+    return {
+        'orders': Count('order', distinct=True),
+        'units': Coalesce(Sum('quantity'), 0),
+        'revenue': money_sum(F('price') * F('quantity')),
+    }
+
+
+def sales_report(since, until, group_by='day', limit=100):
+    """Order, unit and revenue totals for the period, plus the same figures per day, product or category."""
+    items = sold_items(since, until)
+    if group_by == 'day':
+        rows = items.annotate(day=TruncDate('order__created_at')).values('day')
+        ordering = ('day',)
+    elif group_by == 'product':
+        # Grouped by the snapshot name too, so deleted products still show up.
+        rows = items.values('product', 'name')
+        ordering = ('-revenue', 'product')
+    else:
+        rows = items.values(category=F('product__category'), category_name=F('product__category__name'))
+        ordering = ('-revenue', 'category')
+    return {
+        'since': since,
+        'until': until,
+        'group_by': group_by,
+        'totals': items.aggregate(**sales_figures()),
+        'rows': list(rows.annotate(**sales_figures()).order_by(*ordering)[:limit]),
+    }
+
+
+def stock_report():
+    """Products, units on hand, stock value and sold-out products, per category and overall."""
+    figures = {
+        'products': Count('id'),
+        'units': Coalesce(Sum('quantity'), 0),
+        'value': money_sum(F('price') * F('quantity')),
+        'out_of_stock': Count('id', filter=Q(quantity=0)),
+    }
+    rows = Product.objects.values('category', category_name=F('category__name')).annotate(**figures)
+    return {
+        'totals': Product.objects.aggregate(**figures),
+        'rows': list(rows.order_by('category')),
+    }
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import SalesReportView, StockReportView
+
+
+urlpatterns = [
+    path('reports/sales/', SalesReportView.as_view(), name='report-sales'),
+    path('reports/stock/', StockReportView.as_view(), name='report-stock'),
+]
@@ -0,0 +1,30 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..instrumentation.mixins import InstrumentedViewMixin
+from ..routers import ReplicaReadsMixin
+from .serializers import SalesReportQuerySerializer
+from .services import sales_report, stock_report
+
+
+class SalesReportView(InstrumentedViewMixin, ReplicaReadsMixin, APIView):
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(query_serializer=SalesReportQuerySerializer,
+                         operation_description='Orders, units and revenue of placed orders, per day, product or '
+                                               'category.')
+    def get(self, request):
+        serializer = SalesReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(sales_report(**serializer.validated_data))
+
+
+class StockReportView(InstrumentedViewMixin, ReplicaReadsMixin, APIView):
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(operation_description='Products, units on hand, stock value and sold-out products per '
+                                               'category.')
+    def get(self, request):
+        return Response(stock_report())
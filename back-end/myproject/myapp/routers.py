@@ -0,0 +1,101 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+class RoutingState:
+    """Where the current request's reads go: a replica alias, until something pins them to the primary."""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.pinned = False
+
+
+routing = ContextVar('database_routing', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def choose_replica():
+    replicas = get_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary."""
+    state = routing.get()
+    if state is not None:
+        state.pinned = True
+
+
+def pin_if_recent(version):
+    """
+    Pin reads to the primary if the catalog was written less than
+    DATABASE_REPLICA_LAG seconds ago (`version` is a write time in ns), so a
+    replica that is behind cannot put stale rows under the new cache version.
+    """
+    if time.time_ns() - version < getattr(settings, 'DATABASE_REPLICA_LAG', 5) * 1_000_000_000:
+        pin_to_primary()
+
+
+@contextmanager
+def replica_reads():
+    token = routing.set(RoutingState(choose_replica()))
+    try:
+        yield
+    finally:
+        routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads go to a replica only while a catalog read view has chosen one (see
+    ReplicaReadsMixin and `replica_reads()`). Writes, and any read after a
+    write or inside a transaction, use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.replica is None:
+            return None
+        if state.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write an instance back to the replica it was read from.
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas() and not connections[db].settings_dict['TEST'].get('MIRROR')
+
+
+class ReplicaReadsMixin:
+    """Serve the view's safe read actions from a replica (see PrimaryReplicaRouter)."""
+    replica_actions = ('list', 'retrieve', 'facets')
+
+    def dispatch(self, request, *args, **kwargs):
+        token = routing.set(RoutingState())
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            routing.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permission checks above stay on the primary.
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if request.method in SAFE_METHODS and (action is None or action in self.replica_actions):
+            routing.get().replica = choose_replica()
@@ -0,0 +1,260 @@
+import logging
+import os
+import random
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import module_has_submodule
+
+from ..models import Job
+
+
+# A database-backed job queue. Tasks are functions registered with @task in a
+# `tasks` module of one of the app's packages; `enqueue()` adds a Job row once
+# the caller's transaction commits, and `manage.py run_tasks` workers claim
+# due jobs, run them and retry failures with exponential backoff.
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def get_options():
+    return {
+        # Run each task in the enqueueing process right after the commit instead of queueing it.
+        'EAGER': False,
+        'MAX_ATTEMPTS': 5,
+        # Attempt n is retried after BACKOFF * 2 ** (n - 1) seconds (at most BACKOFF_MAX), plus up to 25%.
+        'BACKOFF': 5,
+        'BACKOFF_MAX': 3600,
+        # A job still running after LEASE seconds is taken to have lost its worker and is run again.
+        'LEASE': 600,
+        'BATCH_SIZE': 10,
+        'POLL_INTERVAL': 1.0,
+        # Finished jobs are deleted after KEEP_DONE seconds; failed ones stay for inspection.
+        'KEEP_DONE': 24 * 3600,
+        # {task name: seconds}: tasks the workers queue again that long after each run.
+        'PERIODIC': {},
+        **getattr(settings, 'TASKS', {}),
+    }
+
+
+class Retry(Exception):
+    """Raise from a task to have it run again after `countdown` seconds; counts as a failed attempt."""
+
+    def __init__(self, message='Retry requested', countdown=None):
+        super().__init__(message)
+        self.countdown = countdown
+
+
+class Task:
+    def __init__(self, fn, name, max_attempts=None):
+        self.fn = fn
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args):
+        return self.fn(*args)
+
+    def enqueue(self, *args, key=None, countdown=0):
+        enqueue(self.name, *args, key=key, countdown=countdown, max_attempts=self.max_attempts)
+
+
+def task(name, max_attempts=None):
+    """Register the decorated function as the task `name`. Its arguments must be JSON serializable."""
+    def register(fn):
+        registry[name] = Task(fn, name, max_attempts)
+        return registry[name]
+    return register
+
+
+def autodiscover():
+    """Import the `tasks` module of each of the app's packages, registering their tasks."""
+    app = apps.get_app_config('myapp')
+    for entry in sorted(os.scandir(app.path), key=lambda entry: entry.name):
+        if not os.path.isfile(os.path.join(entry.path, '__init__.py')):
+            continue
+        package = import_module(f'{app.name}.{entry.name}')
+        if module_has_submodule(package, 'tasks'):
+            import_module(f'{package.__name__}.tasks')
+
+
+def create_job(name, args=(), key=None, countdown=0, max_attempts=None):
+    # INSERT ... ON CONFLICT DO NOTHING: a pending job with the same key already covers this one.
+    Job.objects.bulk_create([Job(
+        task=name, args=list(args), key=key, max_attempts=max_attempts or get_options()['MAX_ATTEMPTS'],
+        run_at=timezone.now() + timedelta(seconds=countdown),
+    )], ignore_conflicts=True)
+
+
+def enqueue(name, *args, key=None, countdown=0, max_attempts=None):
+    """
+    Queue the task `name` once the current transaction commits (at once outside one).
+
+    Workers never see jobs for writes that were rolled back, and the request
+    only pays for one INSERT. While a job with the same `key` is pending,
+    this is a no-op, so a burst of writes queues one rebuild.
+    """
+    if get_options()['EAGER']:
+        transaction.on_commit(lambda: registry[name](*args), robust=True)
+        return
+    transaction.on_commit(lambda: create_job(name, args, key, countdown, max_attempts))
+
+
+def backoff(attempts):
+    options = get_options()
+    return min(options['BACKOFF'] * 2 ** (attempts - 1), options['BACKOFF_MAX']) * random.uniform(1, 1.25)
+
+
+def periodic_key(name):
+    return f'periodic:{name}'
+
+
+def schedule_periodic():
+    """Queue every PERIODIC task that has no pending or running job, to run now."""
+    for name in get_options()['PERIODIC']:
+        if not Job.objects.filter(key=periodic_key(name), status__in=[Job.Status.PENDING, Job.Status.RUNNING]).exists():
+            create_job(name, key=periodic_key(name))
+
+
+def reschedule(job):
+    interval = get_options()['PERIODIC'].get(job.task)
+    if interval is not None and job.key == periodic_key(job.task):
+        create_job(job.task, key=job.key, countdown=interval)
+
+
+def claim(limit):
+    """
+    Mark up to `limit` due jobs as running and return them.
+
+    Due jobs are read without locks and flipped with one conditional UPDATE
+    tagged with a fresh claim id, so workers racing for the same rows each
+    end up with a disjoint share. Jobs whose lease ran out are due again.
+    """
+    now = timezone.now()
+    due = Q(status=Job.Status.PENDING, run_at__lte=now) | Q(status=Job.Status.RUNNING, locked_until__lt=now)
+    ids = list(Job.objects.filter(due).order_by('run_at').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    claim_id = uuid.uuid4().hex
+    Job.objects.filter(due, id__in=ids).update(
+        status=Job.Status.RUNNING, claim=claim_id, attempts=F('attempts') + 1,
+        locked_until=now + timedelta(seconds=get_options()['LEASE']),
+    )
+    return list(Job.objects.filter(id__in=ids, claim=claim_id).order_by('run_at'))
+
+
+def release(jobs):
+    """Put claimed jobs that were not started back in the queue (a worker shutting down)."""
+    for job in jobs:
+        try:
+            with transaction.atomic():
+                Job.objects.filter(id=job.id, claim=job.claim).update(
+                    status=Job.Status.PENDING, attempts=F('attempts') - 1, locked_until=None)
+        except IntegrityError:
+            # A job with the same key was queued while this one was claimed and will do the work.
+            Job.objects.filter(id=job.id, claim=job.claim).delete()
+
+
+def finish(job):
+    Job.objects.filter(id=job.id, claim=job.claim).update(
+        status=Job.Status.DONE, error='', locked_until=None, finished_at=timezone.now())
+    reschedule(job)
+
+
+def fail(job, error, countdown=None):
+    if job.attempts >= job.max_attempts:
+        logger.error('Job %s (%s) failed for good after %d attempts', job.id, job.task, job.attempts)
+        Job.objects.filter(id=job.id, claim=job.claim).update(
+            status=Job.Status.FAILED, error=error, locked_until=None, finished_at=timezone.now())
+        reschedule(job)
+        return
+    run_at = timezone.now() + timedelta(seconds=backoff(job.attempts) if countdown is None else countdown)
+    try:
+        with transaction.atomic():
+            Job.objects.filter(id=job.id, claim=job.claim).update(
+                status=Job.Status.PENDING, error=error, locked_until=None, run_at=run_at)
+    except IntegrityError:
+        # A job with the same key was queued in the meantime and will do the work.
+        Job.objects.filter(id=job.id, claim=job.claim).delete()
+
+
+def run(job):
+    """Run one claimed job; returns whether it succeeded."""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError(f'Gave up after {job.max_attempts} attempts; the last one never finished.')
+        if job.task not in registry:
+            # A worker running older code than the process that queued the job; retried later.
+            raise LookupError(f'Unknown task {job.task!r}')
+        registry[job.task](*job.args)
+    except Exception as exc:
+        logger.warning('Job %s (%s) failed on attempt %d', job.id, job.task, job.attempts, exc_info=True)
+        fail(job, ''.join(traceback.format_exception(exc)), getattr(exc, 'countdown', None))
+        return False
+    finish(job)
+    return True
+
+
+def prune(batch_size=1000):
+    """Delete jobs that finished more than KEEP_DONE seconds ago; returns how many were deleted."""
+    before = timezone.now() - timedelta(seconds=get_options()['KEEP_DONE'])
+    deleted = 0
+    while True:
+        ids = list(Job.objects.filter(status=Job.Status.DONE, finished_at__lt=before)
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def run_pending():
+    """Run due jobs in this process until none are left; returns (succeeded, failed)."""
+    succeeded = failed = 0
+    while True:
+        jobs = claim(get_options()['BATCH_SIZE'])
+        if not jobs:
+            return succeeded, failed
+        for job in jobs:
+            if run(job):
+                succeeded += 1
+            else:
+                failed += 1
+
+
+class Worker:
+    """Claims and runs jobs until stop() is called; the job being run is finished first."""
+    prune_every = 300
+
+    def __init__(self):
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self):
+        options = get_options()
+        schedule_periodic()
+        pruned_at = 0
+        while not self.stopping.is_set():
+            close_old_connections()
+            jobs = claim(options['BATCH_SIZE'])
+            for index, job in enumerate(jobs):
+                if self.stopping.is_set():
+                    release(jobs[index:])
+                    break
+                run(job)
+            if timezone.now().timestamp() - pruned_at > self.prune_every:
+                prune()
+                pruned_at = timezone.now().timestamp()
+            if len(jobs) < options['BATCH_SIZE']:
+                self.stopping.wait(options['POLL_INTERVAL'])
+        close_old_connections()
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,6 +38,10 @@ CORS_ALLOWED_ORIGINS = [
 
 ]
 
+# Guest carts are addressed by this header (see myapp.cart).
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token', 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token', 'Idempotent-Replayed']
+
 
 # Application definition
 
@@ -58,6 +65,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'myapp.instrumentation.middleware.InstrumentationMiddleware',
+    'myapp.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -70,6 +79,24 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'myproject.urls'
 
+# Per-request timings (see myapp.instrumentation). Lower SAMPLE_RATE in production
+# to keep the overhead negligible; unsampled requests are only counted.
+INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', '1.0')),
+    'SERVER_TIMING': DEBUG,
+    # Scraping /metrics requires this bearer token if set, else a request from METRICS_IPS.
+    'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+    'METRICS_IPS': ('127.0.0.1', '::1'),
+}
+
+# Response compression (see myapp.compression): gzip, or brotli when the Brotli
+# package is installed and the client accepts it. Smaller responses are sent as is.
+COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'BROTLI': True,
+    'BROTLI_QUALITY': 5,
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -92,11 +119,20 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'myapp.api.authentication.CachedJWTAuthentication',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 6
+    'PAGE_SIZE': 6,
+    # Prices are decimals; keep rendering them as JSON numbers, as when they were floats.
+    'COERCE_DECIMAL_TO_STRING': False,
+
+    # Scopes used by myapp.api.throttling on login, token and register.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_username': '5/min',
+        'register_ip': '10/hour',
+    },
 
 }
 
@@ -132,22 +168,111 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "myapp.api.serializers.FilteredTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
-    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "myapp.api.serializers.FilteredTokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# Postgres when POSTGRES_HOST is set (with POSTGRES_DB, POSTGRES_USER,
+# POSTGRES_PASSWORD and POSTGRES_PORT), SQLite otherwise. With DB_POOL_MAX_SIZE
+# set, connections come from Django's psycopg pool (needs psycopg[pool]);
+# otherwise each worker keeps its connection for DB_CONN_MAX_AGE seconds and
+# health-checks it before reuse. POSTGRES_REPLICA_HOSTS (comma separated) adds
+# read replicas, used by myapp.routers for the catalog read views.
+def postgres_database(host):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'HOST': host,
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'NAME': os.environ.get('POSTGRES_DB', 'myproject'),
+        'USER': os.environ.get('POSTGRES_USER', 'myproject'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'connect_timeout': 5},
+    }
+    pool_size = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+    if pool_size:
+        # The pool replaces persistent connections and only hands out healthy ones.
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': min(pool_size, int(os.environ.get('DB_POOL_MIN_SIZE', 2))),
+            'max_size': pool_size,
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    return database
+
+
+if os.environ.get('POSTGRES_HOST'):
+    DATABASES = {'default': postgres_database(os.environ['POSTGRES_HOST'])}
+    replica_hosts = [host.strip() for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()]
+    for number, host in enumerate(replica_hosts, start=1):
+        DATABASES[f'replica_{number}'] = {**postgres_database(host), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS = [f'replica_{number}' for number in range(1, len(replica_hosts) + 1)]
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        # The same file under a second alias, so the tests can route reads to a "replica".
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['myapp.routers.PrimaryReplicaRouter']
+# After a catalog write, reads stay on the primary for this many seconds so a
+# lagging replica is not cached under the new version.
+DATABASE_REPLICA_LAG = float(os.environ.get('DB_REPLICA_LAG', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so the catalog
+# version counters are seen by every worker process.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 300
+
+# Lower bounds of the price histogram buckets on /products/facets/; the last bucket is open-ended.
+# Run `manage.py rebuild_facet_counts` after changing them.
+CATALOG_PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+
+# Unconfirmed stock reservations are returned by the periodic `inventory.release_expired`
+# task (see TASKS) or `manage.py release_expired_reservations`.
+RESERVATION_TTL = timedelta(minutes=15)
+
+# Users resolved from JWTs are cached for this many seconds (see myapp.api.authentication).
+# Changes such as deactivating a user reach the other processes through this
+# cache, so it must be shared (Redis/Memcached); with a per-process locmem cache
+# users are only cached for a few seconds.
+AUTH_USER_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Bloom filter of blacklisted refresh tokens (see myapp.api.blacklist). Expired
+# entries are removed by the periodic `accounts.compact_token_blacklist` task
+# (see TASKS) or `manage.py compact_token_blacklist`. The filter is only used
+# when TOKEN_BLACKLIST_CACHE_ALIAS is shared by every process; with a locmem
+# cache each refresh checks the blacklist table.
+TOKEN_BLACKLIST_CACHE_ALIAS = 'default'
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -168,6 +293,67 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    'myapp.api.hashing.PooledModelBackend',
+]
+
+# Password hashing runs on a bounded pool (see myapp.api.hashing); requests
+# beyond MAX_PENDING queued hashes get a 503 with Retry-After.
+PASSWORD_HASHING = {
+    'EXECUTOR': 'thread',
+    'WORKERS': 4,
+    'MAX_PENDING': 32,
+    'TIMEOUT': 10,
+    'RETRY_AFTER': 1,
+}
+
+# Sliding-window counters behind the login and register throttles (rates are in
+# REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']). The 'local' store is a per-process
+# LRU, so each worker enforces the limits on its own; 'cache' shares the
+# counters through CACHE_ALIAS, which must then be a cache every worker sees.
+THROTTLING = {
+    'ENABLED': os.environ.get('THROTTLING_ENABLED', '1') == '1',
+    'STORE': os.environ.get('THROTTLING_STORE', 'local'),
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 100000,
+}
+
+# Precomputed /products/ pages (see myapp.products.snapshots), written by
+# `manage.py build_catalog_snapshot`. Afterwards, product writes queue a rebuild
+# of the listings they touched for the task workers (REBUILD = True builds in a
+# thread of the web process instead), and plain list requests are
+# answered from the files while they are current. Listing versions live in
+# CATALOG_CACHE_ALIAS, so with several processes that cache, like ROOT, must be
+# shared by all of them.
+CATALOG_SNAPSHOTS = {
+    'ENABLED': os.environ.get('CATALOG_SNAPSHOTS') == '1',
+    'ROOT': os.environ.get('CATALOG_SNAPSHOTS_ROOT', BASE_DIR / 'catalog-snapshots'),
+    'REBUILD': 'queue',
+}
+
+# Background jobs (see myapp.tasks), run by `manage.py run_tasks` workers: image
+# processing, snapshot rebuilds and welcome emails are queued when their write
+# commits. PERIODIC tasks are queued again that many seconds after each run.
+# TASKS_EAGER=1 runs every job in the process that queued it instead, for
+# development without a worker.
+TASKS = {
+    'EAGER': os.environ.get('TASKS_EAGER') == '1',
+    'PERIODIC': {
+        'accounts.compact_token_blacklist': 3600,
+        'inventory.release_expired': 60,
+        'catalog.build_snapshot': 300,
+    },
+}
+
+# Welcome emails are printed to the console unless EMAIL_BACKEND says otherwise.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+# Serve the account endpoints and the catalog reads with async views;
+# myproject/asgi.py turns these on.
+ASYNC_ACCOUNT_VIEWS = os.environ.get('ASYNC_ACCOUNT_VIEWS') == '1'
+ASYNC_CATALOG_VIEWS = os.environ.get('ASYNC_CATALOG_VIEWS') == '1'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -185,6 +371,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded product images. Stored names are content-addressed and never change,
+# so MEDIA_URL can point at a CDN and the files can be cached forever.
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = os.environ.get('MEDIA_URL', '/media/')
+
+# Variant sizes (longest side in px) and formats generated by `manage.py process_images`.
+IMAGES = {
+    'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,
+    'VARIANTS': {'thumb': 160, 'card': 480, 'large': 1200},
+    'FORMATS': ('webp', 'jpeg'),
+    'THUMBNAIL_VARIANT': 'card',
+    'GALLERY_VARIANT': 'large',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
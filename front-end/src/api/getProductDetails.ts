@@ -26,4 +26,4 @@ export const getProductDetails = async (id: number): Promise<Product | null> =>
         console.error('Error fetching product details:', error.response?.data || error.message);
         return null;
     }
-};
\ No newline at end of file
+};